@@ -1,15 +1,28 @@
-from typing import Dict
-import json
+from typing import Any, Dict, List
+import collections
+import functools
+import ipaddress
+import os
+import time
 import asyncio
+from fastapi.responses import PlainTextResponse
 from nicegui import ui, app
-from ndce.snmp import get_device_info
+from nicegui.events import GenericEventArguments
+from ndce import metrics
 from ndce.net import (
-    telnet_is_enabled,
-    ssh_is_enabled,
     get_hosts_from_subnet,
     is_ip_subnet,
 )
-from ndce.telnet import Telnet
+from ndce.push import PushProgress, PushResult, push_commands, rollout_commands
+from ndce.control import get_controller
+from ndce.discovery import discover_hosts
+from ndce.shard import ShardedDiscovery
+from ndce.store import DeviceStore
+from ndce.table import DiffTable
+from ndce.database import DeviceDatabase
+from ndce.cache import NegativeCache
+from ndce.sessions import SessionPool
+from ndce.ssh import get_ssh_connections
 import config
 
 
@@ -30,8 +43,8 @@ def set_ui_defaults() -> None:
     ui.select.default_props("dense square")
     ui.right_drawer.default_props("bordered")
     ui.column.default_classes("w-full")
-    ui.table.default_classes("shadow-none border rounded-none w-full")
-    ui.table.default_props("dense hide-selected-banner hide-no-data")
+    DiffTable.default_classes("shadow-none border rounded-none w-full")
+    DiffTable.default_props("dense hide-selected-banner hide-no-data")
     ui.footer.default_classes("items-center py-2")
     ui.textarea.default_classes("w-full mt-10")
     ui.textarea.default_props(
@@ -94,16 +107,69 @@ def change_ui_mode() -> None:
     set_ui_mode()
 
 
-def add_device(device: Dict[str, str]) -> None:
+def flush_devices() -> None:
     """
-    Функция добавляет заданное устройство
+    Функция переносит накопленные при обнаружении устройства в базу
+    и передает в таблицу только добавленные строки
     """
-    db_full.append(device)
-    devices_table.add_row(device)
-    apply_filters()
+    global filtered_count
+    changed, removed = negative_cache.changes()
+    if changed or removed:
+        storage.save_unreachable(changed, removed)
+    if not pending_devices:
+        return
+    rows = []
+    updated = []
+    for row in pending_devices:
+        # Повторно опрошенные устройства обновляются на месте
+        if row["host"] in db:
+            updated.append(db.update(row))
+        # Отметки об опросе устройств, удаленных до переноса, пропускаются
+        elif "sysobjectid" in row:
+            db.add(row)
+            rows.append(row)
+    pending_devices.clear()
+    storage.upsert(rows + updated)
+    criteria = filter_criteria()
+    matched = [row for row in rows if DeviceStore.matches(row, criteria)]
+    if matched:
+        if filtered_hosts is not None:
+            filtered_hosts.update(row["host"] for row in matched)
+        filtered_count += len(matched)
+        for select, field in (
+            (lst_categories, "category"),
+            (lst_vendors, "vendor"),
+            (lst_models, "model"),
+        ):
+            values = {row[field] for row in matched} - set(select.options)
+            if values:
+                select.set_options(sorted(set(select.options) | values))
+    if matched or updated:
+        update_pages_count()
+        # Таблица обновляется, только если изменился состав текущей
+        # страницы или обновлены отображаемые на ней устройства
+        page = page_rows()
+        updated_hosts = {row["host"] for row in updated}
+        if [row["host"] for row in page] != [
+            row["host"] for row in devices_table.rows
+        ] or any(row["host"] in updated_hosts for row in page):
+            change_page()
     update_ui()
 
 
+def update_concurrency() -> None:
+    """
+    Функция отображает текущее количество одновременно
+    опрашиваемых устройств во время обнаружения
+    """
+    discovering = any(not task.done() for task in discover_tasks)
+    if discovering:
+        lbl_concurrency.set_text(
+            f"Одновременно: {discovery.in_flight} из {discovery.concurrency}"
+        )
+    lbl_concurrency.set_visibility(discovering)
+
+
 def update_ui() -> None:
     """
     Функция обновляет пользовательский интерфейс
@@ -111,11 +177,11 @@ def update_ui() -> None:
     lst_categories.update()
     lst_vendors.update()
     lst_models.update()
-    lbl_total_devices.set_text(len(db_full))
+    lbl_total_devices.set_text(len(db))
     lbl_total_categories.set_text(len(lst_categories.options))
     lbl_total_vendors.set_text(len(lst_vendors.options))
     lbl_total_models.set_text(len(lst_models.options))
-    lbl_total_filtered.set_text(len(devices_table.rows))
+    lbl_total_filtered.set_text(filtered_count)
     lbl_total_selected.set_text(len(devices_table.selected))
 
 
@@ -123,9 +189,12 @@ def clear_db() -> None:
     """
     Функция очищает базу данных
     """
-    app.storage.general.pop("db")
-    db_full.clear()
-    db_filtered.clear()
+    global filtered_hosts, filtered_count
+    storage.clear()
+    negative_cache.clear()
+    db.clear()
+    filtered_hosts = None
+    filtered_count = 0
     devices_table.clear()
     lst_categories.clear()
     lst_vendors.clear()
@@ -139,10 +208,10 @@ def delete_devices() -> None:
     """
     Функция удаляет устройства, выбранные в таблице
     """
-    global db_full
     if devices_table.selected:
-        db_full = list(filter(lambda row: row not in devices_table.selected, db_full))
-        app.storage.general["db"] = db_full
+        hosts = [row["host"] for row in devices_table.selected]
+        db.remove(hosts)
+        storage.delete(hosts)
         devices_table.remove_rows(devices_table.selected)
         apply_filters()
         update_ui()
@@ -216,43 +285,42 @@ def apply_filters() -> None:
     """
     Функция применяет правила фильтрации
     """
-    global db_filtered
-    db_filtered = list(filter(filter_devices, db_full))
+    global filtered_hosts, filtered_count
+    # Выборка строится пересечением индексов базы, а списки значений
+    # фильтров - по индексам, без повторного перебора устройств.
+    # В таблицу передается только текущая страница выборки.
+    hosts = db.select(filter_criteria())
+    filtered_hosts = hosts
+    filtered_count = len(db) if hosts is None else len(hosts)
     devices_table.clear()
-    devices_table.update_rows(db_filtered, clear_selection=True)
-    lst_categories.set_options(
-        sorted(list(set(map(lambda row: row["category"], db_filtered))))
-    )
-    lst_vendors.set_options(
-        sorted(list(set(map(lambda row: row["vendor"], db_filtered))))
-    )
-    lst_models.set_options(
-        sorted(list(set(map(lambda row: row["model"], db_filtered))))
-    )
+    lst_categories.set_options(sorted(db.facets("category", hosts)))
+    lst_vendors.set_options(sorted(db.facets("vendor", hosts)))
+    lst_models.set_options(sorted(db.facets("model", hosts)))
     change_page()
     update_ui()
 
 
-def filter_devices(device: Dict[str, str]) -> bool:
+def filter_criteria() -> Dict[str, Any]:
     """
-    Функция определяет, соответствует ли устройство заданному фильтру
+    Функция возвращает условия отбора устройств по заданному фильтру
     """
-    result = True
+    criteria = {}
     if lst_categories.value:
-        result &= device["category"] == lst_categories.value
+        criteria["category"] = lst_categories.value
     if lst_vendors.value:
-        result &= device["vendor"] == lst_vendors.value
+        criteria["vendor"] = lst_vendors.value
     if lst_models.value:
-        result &= device["model"] == lst_models.value
+        criteria["model"] = lst_models.value
     if telnet_switch.value and ssh_switch.value:
-        result &= True
+        pass
     elif telnet_switch.value:
-        result &= device["telnet"]
+        criteria["telnet"] = True
     elif ssh_switch.value:
-        result &= device["ssh"]
+        criteria["ssh"] = True
     else:
-        result &= not device["telnet"] and not device["ssh"]
-    return result
+        criteria["telnet"] = False
+        criteria["ssh"] = False
+    return criteria
 
 
 def reset_filters() -> None:
@@ -271,6 +339,13 @@ def save_clear_status(value: bool) -> None:
     app.storage.general["clear"] = value
 
 
+def save_rescan_status(value: bool) -> None:
+    """
+    Функция сохраняет состояние переключателя инкрементального сканирования
+    """
+    app.storage.general["rescan"] = value
+
+
 def show_discover_dialog() -> ui.dialog:
     """
     Функция отображает окно обнаружения устройств
@@ -291,18 +366,28 @@ def show_discover_dialog() -> ui.dialog:
                 value=app.storage.general.get("clear", False),
                 on_change=lambda: save_clear_status(clear_db_switch.value),
             )
+            rescan_switch = ui.switch(
+                "Опрашивать только устаревшие",
+                value=app.storage.general.get("rescan", False),
+                on_change=lambda: save_rescan_status(rescan_switch.value),
+            ).classes("mt-2")
             with ui.row():
                 ui.button(
                     "Начать",
                     on_click=lambda: get_subnet(
-                        discover_dialog, subnet.value, clear_db_switch.value
+                        discover_dialog,
+                        subnet.value,
+                        clear_db_switch.value,
+                        rescan_switch.value,
                     ),
                 )
                 ui.button("Отмена", on_click=discover_dialog.close)
             if dark_mode.value:
                 clear_db_switch.classes(remove="bg-gray-100")
+                rescan_switch.classes(remove="bg-gray-100")
     else:
         cancel_discover_tasks()
+        flush_devices()
         devices_table.props(remove="loading")
         status_block.set_visibility(False)
         change_discover_button()
@@ -312,11 +397,86 @@ def show_discover_dialog() -> ui.dialog:
         )
 
 
-async def get_subnet(dialog: ui.dialog, subnet: str, clear: bool) -> None:
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint() -> PlainTextResponse:
+    """
+    Функция возвращает метрики опроса в текстовом формате Prometheus
+    """
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+def show_metrics_dialog() -> ui.dialog:
+    """
+    Функция отображает окно метрик опроса по фазам,
+    обновляемое пока окно открыто
+    """
+    ui.label.default_classes(
+        """
+        w-full bg-primary text-base text-center
+        text-white py-2 absolute left-0 top-0
+        """
+    )
+    with ui.dialog(value=True) as metrics_dialog, ui.card().classes("max-w-none"):
+        ui.label("Метрики опроса")
+        metrics_table = ui.table(
+            columns=[
+                {"name": "phase", "label": "Фаза", "field": "phase", "align": "left"},
+                {"name": "total", "label": "Всего", "field": "total"},
+                {"name": "success", "label": "Успешно", "field": "success"},
+                {"name": "timeout", "label": "Таймаут", "field": "timeout"},
+                {"name": "error", "label": "Ошибка", "field": "error"},
+                {"name": "closed", "label": "Отказ", "field": "closed"},
+                {"name": "other", "label": "Прочие", "field": "other"},
+                {"name": "in_flight", "label": "Выполняется", "field": "in_flight"},
+                {"name": "p50_ms", "label": "p50, мс", "field": "p50_ms"},
+                {"name": "p99_ms", "label": "p99, мс", "field": "p99_ms"},
+            ],
+            rows=metrics.summary(),
+            row_key="phase",
+            pagination=0,
+        ).classes("mt-10")
+        lbl_workers = ui.label().classes(replace="text-sm")
+
+        def refresh() -> None:
+            metrics_table.rows = metrics.summary()
+            lbl_workers.set_text(
+                "Обработчики: "
+                + (
+                    ", ".join(
+                        f"{pool} {busy} из {size}"
+                        for pool, busy, size in metrics.pools()
+                    )
+                    or "не запущены"
+                )
+            )
+
+        refresh()
+        timer = ui.timer(config.METRICS_REFRESH_INTERVAL, refresh)
+        metrics_dialog.on("hide", lambda: (timer.cancel(), metrics_dialog.delete()))
+    return metrics_dialog
+
+
+def needs_probe(host: str, now: float) -> bool:
+    """
+    Функция определяет, нужно ли опрашивать адрес при инкрементальном
+    сканировании: известное устройство опрашивается после истечения
+    срока актуальности, не ответивший адрес - после интервала ожидания
+    """
+    device = db.get(host)
+    if device:
+        return now - device.get("last_seen", 0) >= config.RESCAN_TTL
+    return negative_cache.should_probe(host, now)
+
+
+async def get_subnet(
+    dialog: ui.dialog, subnet: str, clear: bool, rescan: bool = False
+) -> None:
     """
     Функция запускает процесс обнаружения устройств
     """
-    global discover_tasks
+    global discover_tasks, discovery
     if is_ip_subnet(subnet):
         change_discover_button()
         # Если установлен переключатель Очистить БД
@@ -326,48 +486,79 @@ async def get_subnet(dialog: ui.dialog, subnet: str, clear: bool) -> None:
         lbl_status.set_text("Обнаружение устройств")
         status_block.set_visibility(True)
         devices_table.props(add="loading")
-        hosts = get_hosts_from_subnet(subnet)
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENT)
-        discover_tasks = [
-            asyncio.create_task(discover_device(host, semaphore)) for host in hosts
-        ]
-        await asyncio.gather(*discover_tasks)
+        # Адреса подсети извлекаются генератором по мере освобождения
+        # обработчиков пула, а не создаются задачей на каждый адрес.
+        targets = get_hosts_from_subnet(subnet)
+        if rescan:
+            now = time.time()
+            targets = (host for host in targets if needs_probe(host, now))
+        # IP адрес - уникальный идентификатор устройства в базе.
+        # Без инкрементального режима известные устройства повторно
+        # не опрашиваются
+        skip = None if rescan else db.__contains__
+        on_failed = functools.partial(discover_failed, rescan=rescan)
+        # Большие подсети опрашиваются несколькими процессами,
+        # чтобы опрос не занимал цикл событий интерфейса
+        processes = config.DISCOVERY_PROCESSES or os.cpu_count() or 1
+        if (
+            processes > 1
+            and ipaddress.ip_network(subnet).num_addresses
+            >= config.DISCOVERY_SHARD_MIN_HOSTS
+        ):
+            discovery = ShardedDiscovery(processes)
+            task = discovery.run(targets, discover_succeeded, on_failed, skip)
+        else:
+            discovery = get_controller()
+            task = discover_hosts(targets, discover_succeeded, on_failed, skip)
+        discover_tasks = [asyncio.create_task(task)]
+        error = None
+        try:
+            await asyncio.gather(*discover_tasks)
+        except asyncio.CancelledError:
+            return
+        except ConnectionError as err:
+            # Не удалось открыть icmp сокет или процессы обнаружения
+            # прерваны до опроса всех адресов
+            error = err
+        flush_devices()
         devices_table.props(remove="loading")
         status_block.set_visibility(False)
         change_discover_button()
         apply_filters()
-        ui.notify(
-            message="Обнаружение устройств завершено", position="top", type="positive"
-        )
+        if error:
+            ui.notify(message=str(error), position="top", type="negative")
+        else:
+            ui.notify(
+                message="Обнаружение устройств завершено",
+                position="top",
+                type="positive",
+            )
     else:
         ui.notify(message="Введите адрес подсети", position="top", type="warning")
 
 
-async def discover_device(host: str, semaphore: asyncio.Semaphore) -> None:
+def discover_failed(host: str, rescan: bool = False) -> None:
     """
-    Функция получает данные по заданному устройству
+    Функция фиксирует адрес, не ответивший при обнаружении
     """
-    device = await get_device_info(host, semaphore, ids)
-    if device:
-        # IP адрес - уникальный идентификатор устройства в базе
-        # Получаем список всех адресов в базе для дальнейшей сверки
-        hosts = [row["host"] for row in db_full]
-        # Добавляется только устройство, которое отсутствует в базе
-        if device["host"] not in hosts:
-            telnet = telnet_is_enabled(host)
-            ssh = ssh_is_enabled(host)
-            row = {
-                "host": device.get("host", "Unknown"),
-                "sysobjectid": device.get("sysobjectid", "Unknown"),
-                "hostname": device.get("hostname", "Unknown"),
-                "vendor": device.get("vendor", "Unknown"),
-                "model": device.get("model", "Unknown"),
-                "category": device.get("category", "Unknown"),
-                "telnet": telnet,
-                "ssh": ssh,
-            }
-            app.storage.general.setdefault("db", []).append(row)
-            add_device(row)
+    # Известные устройства опрашиваются по сроку актуальности,
+    # в кэш не ответивших попадают только новые адреса.
+    # Кэш используется только инкрементальным сканированием
+    if host in db:
+        pending_devices.append({"host": host, "last_probe": time.time()})
+    elif rescan:
+        negative_cache.failed(host)
+
+
+def discover_succeeded(row: Dict[str, Any]) -> None:
+    """
+    Функция фиксирует обнаруженное устройство
+    """
+    negative_cache.succeeded(row["host"])
+    # Устройства накапливаются и передаются в таблицу пакетами
+    pending_devices.append(row)
+    if len(pending_devices) >= config.REFRESH_BATCH_SIZE:
+        flush_devices()
 
 
 def show_configure_dialog() -> ui.dialog:
@@ -390,14 +581,32 @@ def show_configure_dialog() -> ui.dialog:
                     label="Список команд",
                     placeholder="Вводите по одной команде на строку",
                 )
+                rollout_switch = ui.switch(
+                    "Поэтапная передача",
+                    value=app.storage.general.get("rollout", False),
+                    on_change=lambda: save_rollout_status(rollout_switch.value),
+                ).classes("mt-2")
+                # Команды без общего состояния (просмотр) выполняются по ssh
+                # одновременно в отдельных каналах одного соединения
+                parallel_switch = ui.switch(
+                    "Независимые команды",
+                    value=app.storage.general.get("parallel", False),
+                    on_change=lambda: save_parallel_status(parallel_switch.value),
+                )
                 with ui.row():
                     ui.button(
                         "Начать",
                         on_click=lambda: send_commands(
-                            configure_dialog, commands.value
+                            configure_dialog,
+                            commands.value,
+                            rollout_switch.value,
+                            parallel_switch.value,
                         ),
                     )
                     ui.button("Отмена", on_click=configure_dialog.close)
+                if dark_mode.value:
+                    rollout_switch.classes(remove="bg-gray-100")
+                    parallel_switch.classes(remove="bg-gray-100")
     else:
         cancel_configure_tasks()
         devices_table.props(remove="loading")
@@ -408,7 +617,122 @@ def show_configure_dialog() -> ui.dialog:
         ui.notify(message="Передача команд прекращена", position="top", type="info")
 
 
-async def send_commands(dialog: ui.dialog, commands: str) -> None:
+def save_rollout_status(value: bool) -> None:
+    """
+    Функция сохраняет состояние переключателя поэтапной передачи команд
+    """
+    app.storage.general["rollout"] = value
+
+
+def save_parallel_status(value: bool) -> None:
+    """
+    Функция сохраняет состояние переключателя независимых команд
+    """
+    app.storage.general["parallel"] = value
+
+
+def show_push_progress(result: PushResult, progress: PushProgress) -> None:
+    """
+    Функция отображает ход передачи команд устройствам
+    """
+    text = f"Передано {progress.done} из {progress.total}, ошибок: {progress.failed}"
+    if progress.unreachable:
+        text += f", из них недоступно: {progress.unreachable}"
+    if progress.wave:
+        text = f"Волна {progress.wave}. {text}"
+    lbl_status.set_text(text)
+
+
+def push_result_rows(
+    devices: List[Dict[str, Any]], results: List[PushResult]
+) -> List[Dict[str, Any]]:
+    """
+    Функция формирует строки таблицы результатов передачи команд
+    в порядке выбранных устройств. Устройства, которым команды
+    не передавались из-за остановки поэтапной передачи, отмечаются
+    как не обработанные.
+    """
+    by_host = {result.host: result for result in results}
+    rows = []
+    for device in devices:
+        result = by_host.get(device["host"])
+        if result is None:
+            status = "Не обработано"
+        elif result.success:
+            status = "Успешно"
+        elif not result.reachable:
+            status = "Недоступно"
+        else:
+            status = "Ошибка"
+        rows.append(
+            {
+                "host": device["host"],
+                "hostname": device.get("hostname", ""),
+                "status": status,
+                "error": result.error if result else "",
+                "duration": round(result.duration, 1) if result else "",
+                "output": "\n".join(
+                    f"{command}\n{output}" for command, output in result.output
+                )
+                if result
+                else "",
+            }
+        )
+    return rows
+
+
+def show_push_results_dialog(
+    devices: List[Dict[str, Any]], results: List[PushResult]
+) -> ui.dialog:
+    """
+    Функция отображает окно результатов передачи команд: состояние,
+    ошибку и вывод команд каждого выбранного устройства
+    """
+    ui.label.default_classes(
+        """
+        w-full bg-primary text-base text-center
+        text-white py-2 absolute left-0 top-0
+        """
+    )
+    with ui.dialog(value=True) as results_dialog, ui.card().classes("max-w-none"):
+        ui.label("Результаты передачи команд")
+        ui.table(
+            columns=[
+                {"name": "host", "label": "IP адрес", "field": "host", "align": "left"},
+                {
+                    "name": "hostname",
+                    "label": "Имя",
+                    "field": "hostname",
+                    "align": "left",
+                },
+                {
+                    "name": "status",
+                    "label": "Состояние",
+                    "field": "status",
+                    "align": "left",
+                    "sortable": True,
+                },
+                {"name": "error", "label": "Ошибка", "field": "error", "align": "left"},
+                {"name": "duration", "label": "Время, с", "field": "duration"},
+                {
+                    "name": "output",
+                    "label": "Вывод",
+                    "field": "output",
+                    "align": "left",
+                    "classes": "whitespace-pre-wrap font-mono",
+                },
+            ],
+            rows=push_result_rows(devices, results),
+            row_key="host",
+            pagination=config.PUSH_RESULTS_PER_PAGE,
+        ).classes("mt-10")
+        results_dialog.on("hide", results_dialog.delete)
+    return results_dialog
+
+
+async def send_commands(
+    dialog: ui.dialog, commands: str, rollout: bool = False, parallel: bool = False
+) -> None:
     """
     Функция передает заданные команды выбранным устройствам
     """
@@ -416,21 +740,65 @@ async def send_commands(dialog: ui.dialog, commands: str) -> None:
     if commands:
         dialog.close()
         # Посылаем команды только выбранным устройствам
-        ips = [device["host"] for device in devices_table.selected]
+        devices = list(devices_table.selected)
         commands_list = [f"{command}\n" for command in commands.split("\n")]
-        configure_tasks = [
-            Telnet(ip=ip, commands=commands_list).cli_connect() for ip in ips
-        ]
+        change_configure_button()
         lbl_status.set_text("Идет передача комманд")
         devices_table.props(add="loading")
         status_block.set_visibility(True)
-        await asyncio.gather(*configure_tasks)
+        # Количество одновременных сессий ограничено пулом обработчиков.
+        # При поэтапной передаче устройства обрабатываются волнами
+        progress = PushProgress(total=len(devices))
+        push = rollout_commands if rollout else push_commands
+        configure_tasks = [
+            asyncio.create_task(
+                push(
+                    devices,
+                    commands_list,
+                    on_result=show_push_progress,
+                    progress=progress,
+                    pool=session_pool,
+                    parallel=parallel,
+                )
+            )
+        ]
+        try:
+            results = (await asyncio.gather(*configure_tasks))[0]
+        except asyncio.CancelledError:
+            return
         status_block.set_visibility(False)
         devices_table.props(remove="loading")
+        change_configure_button()
+        failed = [result for result in results if not result.success]
+        # Результаты по каждому устройству, в том числе не обработанным
+        # после остановки поэтапной передачи
+        show_push_results_dialog(devices, results)
+        if progress.stopped:
+            ui.notify(
+                message=(
+                    f"Передача остановлена на волне {progress.wave}: "
+                    f"доля ошибок среди доступных устройств "
+                    f"{progress.failure_rate:.0%}, "
+                    f"не обработано устройств: {len(devices) - len(results)}"
+                ),
+                position="top",
+                type="negative",
+            )
+            return
+        message = (
+            f"Передано {len(commands_list)} команд на "
+            f"{len(results) - len(failed)} устройств, ошибок: {len(failed)}"
+        )
+        if failed:
+            # Причины ошибок группируются, адреса устройств не перечисляются
+            reasons = collections.Counter(result.error for result in failed)
+            message += ". " + "; ".join(
+                f"{reason}: {count}" for reason, count in reasons.most_common(3)
+            )
         ui.notify(
-            message=f"Передано {len(commands)} команд на {len(ips)} устройств",
+            message=message,
             position="top",
-            type="positive",
+            type="warning" if failed else "positive",
         )
     else:
         ui.notify(
@@ -438,38 +806,65 @@ async def send_commands(dialog: ui.dialog, commands: str) -> None:
         )
 
 
-def change_page() -> None:
+def update_pages_count() -> None:
     """
-    Функция осуществляет переход к странице
+    Функция пересчитывает количество страниц и номер текущей страницы
     """
-    global rows_per_page, pages_count, current_page
-    devices_count = len(db_filtered)
-    if devices_count > 0:
-        if rows_per_page > 0:
-            pages_count = devices_count // rows_per_page
-            if devices_count % rows_per_page != 0:
-                pages_count += 1
-            if pages_count > 0:
-                if current_page == 0:
-                    current_page = 1
-                elif current_page > pages_count:
-                    current_page = pages_count
-            else:
-                pages_count = 0
-                current_page = 0
-            devices_table.update_rows(
-                db_filtered[
-                    (current_page - 1) * rows_per_page : current_page * rows_per_page
-                ]
-            )
-        else:
-            devices_table.update_rows(db_filtered)
-            pages_count = 1
-            current_page = 1
+    global pages_count, current_page
+    pages_count = -(-filtered_count // rows_per_page)
+    if pages_count > 0:
+        current_page = min(max(current_page, 1), pages_count)
     else:
-        pages_count = 0
         current_page = 0
     lbl_active_pages.set_text(f"{current_page} из {pages_count}")
+    # Таблица работает в режиме серверной постраничной выдачи:
+    # при заданном rowsNumber сортировка запрашивается у сервера
+    devices_table.pagination = {
+        "page": max(current_page, 1),
+        "rowsPerPage": rows_per_page,
+        "sortBy": sort_by,
+        "descending": descending,
+        "rowsNumber": filtered_count,
+    }
+
+
+def page_rows() -> List[Dict[str, Any]]:
+    """
+    Функция возвращает устройства текущей страницы
+    """
+    if current_page == 0:
+        return []
+    return db.page(
+        filtered_hosts,
+        sort_by,
+        descending,
+        (current_page - 1) * rows_per_page,
+        rows_per_page,
+    )
+
+
+def change_page() -> None:
+    """
+    Функция осуществляет переход к странице
+    """
+    update_pages_count()
+    devices_table.update_rows(page_rows())
+
+
+def request_page(event: GenericEventArguments) -> None:
+    """
+    Функция обрабатывает запрос таблицей страницы с новой сортировкой
+    """
+    global sort_by, descending, current_page
+    pagination = event.args["pagination"]
+    sort_by = pagination.get("sortBy") or None
+    if sort_by not in {
+        column["field"] for column in config.COLUMNS_SETTINGS if column.get("sortable")
+    }:
+        sort_by = None
+    descending = bool(pagination.get("descending"))
+    current_page = pagination.get("page") or current_page
+    change_page()
 
 
 def goto_first_page() -> None:
@@ -514,10 +909,16 @@ if __name__ in {"__main__", "__mp_main__"}:
     ui.run(title=config.APP_TITLE, port=8888, reconnect_timeout=60)
 
     discover_tasks = []
+    # Источник количества одновременно опрашиваемых устройств
+    discovery = get_controller()
     configure_tasks = []
-    ids = {}
-    db_full = []
-    db_filtered = []
+    pending_devices = []
+    db = DeviceStore()
+    # Выборка фильтра: None - все устройства базы
+    filtered_hosts = None
+    filtered_count = 0
+    sort_by = None
+    descending = False
 
     rows_per_page = app.storage.general.get("rows_per_page", config.ROWS_PER_PAGE)
     # Если ранее сохранено количество строк на странице, а после
@@ -528,18 +929,18 @@ if __name__ in {"__main__", "__mp_main__"}:
         if config.ROWS_COUNT_OPTIONS:
             rows_per_page = config.ROWS_COUNT_OPTIONS[0]
         else:
-            rows_per_page = 0
+            rows_per_page = config.ROWS_PER_PAGE
     pages_count = 0
     current_page = 0
 
     dark_mode = ui.dark_mode()
     dark_mode.set_value(app.storage.general.get("dark_mode", False))
 
-    try:
-        with open(config.SYS_OBJECT_IDS_DB) as file:
-            ids = json.load(file)
-    except Exception as err:
-        print(err)
+    # Индекс идентификаторов загружается при первом опросе устройства
+    if not (
+        os.path.exists(config.SYS_OBJECT_IDS_INDEX)
+        or os.path.exists(config.SYS_OBJECT_IDS_DB)
+    ):
         ui.notify(
             message="База идентификаторов сетевых устройств не обнаружена",
             position="top",
@@ -577,10 +978,6 @@ if __name__ in {"__main__", "__mp_main__"}:
             .props(add='dark borderless options-dark="false"', remove="outlined")
             .tooltip("Устройств на странице")
         )
-        # Наличие значения 0 обязательно в списке так как именно оно
-        # дает возможность вывода полного списка устройств
-        if 0 not in rows_per_page_dropdown.options:
-            rows_per_page_dropdown.options.insert(0, 0)
         ui.separator()
         ui.button(icon="delete_outline", on_click=delete_devices).tooltip(
             "Удаление устройств"
@@ -600,6 +997,9 @@ if __name__ in {"__main__", "__mp_main__"}:
         btn_discover = ui.button(icon="search", on_click=show_discover_dialog).tooltip(
             "Начать обнаружение"
         )
+        ui.button(icon="insights", on_click=show_metrics_dialog).tooltip(
+            "Метрики опроса"
+        )
         ui.separator()
         btn_mode = ui.button(icon="dark_mode", on_click=change_ui_mode).tooltip(
             "Темный"
@@ -631,10 +1031,12 @@ if __name__ in {"__main__", "__mp_main__"}:
             status_block.set_visibility(False)
             status_spinner = ui.spinner(type="tail", size="64px")
             lbl_status = ui.label()
+            lbl_concurrency = ui.label().classes("text-xs")
         ui.space()
         ui.button("Сбросить фильтр", on_click=reset_filters)
     # Table section
-    with ui.table(
+    # Браузерам передаются только изменения строк таблицы
+    with DiffTable(
         rows=[],
         columns=config.COLUMNS_SETTINGS,
         column_defaults=config.COLUMNS_DEFAULTS,
@@ -642,6 +1044,7 @@ if __name__ in {"__main__", "__mp_main__"}:
         selection="multiple",
         on_select=lambda: lbl_total_selected.set_text(len(devices_table.selected)),
     ) as devices_table:
+        devices_table.on("request", request_page)
         devices_table.add_slot(
             "body-cell-snmp",
             """
@@ -666,6 +1069,16 @@ if __name__ in {"__main__", "__mp_main__"}:
             </q-td>
         """,
         )
+        # Строки передаются таблице изменениями, поэтому NiceGUI не находит
+        # в них списков и не добавляет шаблон для списка портов сам
+        devices_table.add_slot(
+            "body-cell-ports",
+            """
+            <q-td key="ports" :props="props">
+                {{ Array.isArray(props.value) ? props.value.join(', ') : props.value }}
+            </q-td>
+        """,
+        )
     # Footer section
     with ui.footer():
         ui.label("Устройств:")
@@ -688,7 +1101,27 @@ if __name__ in {"__main__", "__mp_main__"}:
 
     set_ui_mode()
 
-    for device in app.storage.general.get("db", []):
-        add_device(device)
+    ui.timer(config.REFRESH_INTERVAL, flush_devices)
+    ui.timer(config.REFRESH_INTERVAL, update_concurrency)
+
+    # Пул авторизованных сессий для повторных передач команд
+    session_pool = SessionPool() if config.SESSION_POOL_ENABLED else None
+    if session_pool is not None:
+        ui.timer(config.SESSION_IDLE_TIMEOUT / 10, session_pool.expire)
+    # Неиспользуемые ssh соединения закрываются по тому же интервалу
+    ui.timer(
+        config.SESSION_IDLE_TIMEOUT / 10, lambda: get_ssh_connections().expire()
+    )
+
+    storage = DeviceDatabase(config.DB_PATH)
+    # Однократный перенос базы из общего хранилища NiceGUI в sqlite
+    if "db" in app.storage.general:
+        storage.migrate(app.storage.general["db"])
+        app.storage.general.pop("db")
+    negative_cache = NegativeCache(storage.load_unreachable())
+
+    # База загружается за один проход с построением индексов,
+    # таблица и фильтры отрисовываются один раз
+    db.extend(storage.load())
 
     apply_filters()
@@ -0,0 +1,234 @@
+"""
+Замер производительности обнаружения и передачи команд на моделируемых
+устройствах, без реальной сети:
+
+    python -m bench [--sizes 256,4096,65536] [--scenarios snmp,discover,telnet]
+
+Устройства моделируются на адресах loopback 127.64.0.0/10: snmp агенты -
+одним udp сокетом (требуется Linux), командная строка по telnet - одним
+tcp сервером. Каждый замер выполняется в отдельном процессе, чтобы
+пиковый объем памяти относился только к нему.
+
+Сценарии:
+    snmp     - get_device_info для каждого устройства
+    discover - discover_hosts: icmp, snmp и проверка портов
+    telnet   - Telnet.cli_connect с одной командой для каждого устройства
+
+Для snmp и telnet задержка - время одной операции, для discover -
+время от начала обнаружения до получения записи об устройстве.
+"""
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import ipaddress
+import json
+import resource
+import subprocess
+import sys
+import time
+
+
+SCENARIOS = ('snmp', 'discover', 'telnet')
+DEFAULT_SIZES = '256,1024,4096,16384,65536'
+
+
+def get_hosts(size: int) -> List[str]:
+    """
+    Функция возвращает адреса loopback для заданного количества устройств
+    """
+    network = ipaddress.ip_network('127.64.0.0/10')
+    hosts = []
+    for host in network.hosts():
+        hosts.append(str(host))
+        if len(hosts) == size:
+            break
+    return hosts
+
+
+def percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+async def bench_snmp(hosts: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    from bench.agents import SnmpAgentFleet
+    from ndce.control import get_controller
+    from ndce.pool import run_workers
+    from ndce.snmp import get_device_info
+    import config
+    latencies = []
+    failed = 0
+
+    async def handle(host: str) -> None:
+        nonlocal failed
+        started = time.perf_counter()
+        device = await get_device_info(host)
+        latencies.append(time.perf_counter() - started)
+        if not device:
+            failed += 1
+
+    async with SnmpAgentFleet(args.snmp_port, args.latency, args.loss):
+        started = time.perf_counter()
+        if args.workers:
+            await run_workers(hosts, handle, args.workers)
+        else:
+            await run_workers(
+                hosts, handle, config.MAX_CONCURRENT, limiter=get_controller()
+            )
+        elapsed = time.perf_counter() - started
+    return {'elapsed': elapsed, 'latencies': latencies, 'failed': failed}
+
+
+async def bench_discover(hosts: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    from bench.agents import SnmpAgentFleet
+    from ndce.discovery import discover_hosts
+    from ndce.store import DeviceStore
+    db = DeviceStore()
+    latencies = []
+    failed = 0
+
+    def on_device(row: Dict[str, Any]) -> None:
+        latencies.append(time.perf_counter() - started)
+        db.add(row)
+
+    def on_failed(_: str) -> None:
+        nonlocal failed
+        failed += 1
+
+    async with SnmpAgentFleet(args.snmp_port, args.latency, args.loss):
+        started = time.perf_counter()
+        await discover_hosts(hosts, on_device, on_failed, workers=args.workers)
+        elapsed = time.perf_counter() - started
+    return {'elapsed': elapsed, 'latencies': latencies, 'failed': failed}
+
+
+async def bench_telnet(hosts: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    from bench.agents import TelnetServer
+    from ndce.pool import run_workers
+    from ndce.telnet import Telnet
+    import config
+    latencies = []
+    failed = 0
+
+    async def handle(host: str) -> None:
+        nonlocal failed
+        started = time.perf_counter()
+        telnet = Telnet(
+            host,
+            commands=['/system identity print'],
+            sysobjectid=config.MKT_SYS_OBJECT_IDS[0],
+            port=args.telnet_port
+        )
+        try:
+            await telnet.cli_connect()
+        except Exception:
+            failed += 1
+        latencies.append(time.perf_counter() - started)
+
+    async with TelnetServer(args.telnet_port, args.latency, args.loss):
+        started = time.perf_counter()
+        await run_workers(hosts, handle, args.push_workers)
+        elapsed = time.perf_counter() - started
+    return {'elapsed': elapsed, 'latencies': latencies, 'failed': failed}
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Функция выполняет один замер в текущем процессе
+    """
+    import config
+    # Порт агентов задается до импорта модулей опроса:
+    # значения по умолчанию их функций берутся из конфигурации
+    config.SNMP_PORT = args.snmp_port
+    hosts = get_hosts(args.size)
+    bench = {
+        'snmp': bench_snmp,
+        'discover': bench_discover,
+        'telnet': bench_telnet,
+    }[args.scenario]
+    result = asyncio.run(bench(hosts, args))
+    latencies = result['latencies']
+    return {
+        'scenario': args.scenario,
+        'size': args.size,
+        'seconds': round(result['elapsed'], 3),
+        'hosts_per_second': round(args.size / result['elapsed'], 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'failed': result['failed'],
+        # ru_maxrss в Linux измеряется в килобайтах
+        'peak_rss_mb': round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m bench')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='задержка ответа устройства, секунд')
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help='доля потерянных запросов')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='постоянное количество обработчиков опроса, '
+                             'по умолчанию подбирается регулятором')
+    parser.add_argument('--push-workers', type=int, default=None)
+    parser.add_argument('--snmp-port', type=int, default=16161)
+    parser.add_argument('--telnet-port', type=int, default=2323)
+    parser.add_argument('--json', action='store_true',
+                        help='вывод результатов строками JSON')
+    # Служебные аргументы процесса одного замера
+    parser.add_argument('--scenario', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    import config
+    args.push_workers = args.push_workers or config.PUSH_WORKERS
+
+    if args.scenario:
+        print(json.dumps(run(args)))
+        return 0
+
+    options = [
+        '--latency', str(args.latency),
+        '--loss', str(args.loss),
+        '--workers', str(args.workers or 0),
+        '--push-workers', str(args.push_workers),
+        '--snmp-port', str(args.snmp_port),
+        '--telnet-port', str(args.telnet_port),
+    ]
+    columns = (
+        'scenario', 'size', 'seconds', 'hosts_per_second',
+        'p50_ms', 'p99_ms', 'failed', 'peak_rss_mb'
+    )
+    if not args.json:
+        print(''.join(f'{column:>18}' for column in columns))
+    code = 0
+    for scenario in args.scenarios.split(','):
+        for size in map(int, args.sizes.split(',')):
+            process = subprocess.run(
+                [
+                    sys.executable, '-m', 'bench',
+                    '--scenario', scenario, '--size', str(size), *options
+                ],
+                stdout=subprocess.PIPE,
+                text=True
+            )
+            if process.returncode:
+                code = process.returncode
+                print(f'{scenario} {size}: failed', file=sys.stderr)
+                continue
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            if args.json:
+                print(json.dumps(result), flush=True)
+            else:
+                print(''.join(f'{result[column]:>18}' for column in columns), flush=True)
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+from typing import Any, List, Optional, Tuple
+import asyncio
+import random
+import socket
+import struct
+from ndce import ber
+
+
+# Константа Linux: получение адреса назначения входящей датаграммы
+# и выбор адреса источника ответа (в модуле socket не объявлена)
+IP_PKTINFO = getattr(socket, 'IP_PKTINFO', 8)
+
+SYS_NAME = '.1.3.6.1.2.1.1.5.0'
+SYS_DESCR = '.1.3.6.1.2.1.1.1.0'
+SYS_OBJECT_ID = '.1.3.6.1.2.1.1.2.0'
+
+# Описания и идентификаторы моделируемых устройств
+DEVICES: List[Tuple[str, str]] = [
+    ('RouterOS RB750GL', '.1.3.6.1.4.1.14988.1'),
+    ('RB260GS', '.1.3.6.1.4.1.14988.2'),
+    (
+        'SNR-S2985G-24T Device, Compiled Jul 31 21:45:02 2019\r\n'
+        '  SoftWare Version 7.0.3.5(R0241.0222)',
+        '.1.3.6.1.4.1.40418.7.28'
+    ),
+    ('DES-3200-28 Fast Ethernet Switch', '.1.3.6.1.4.1.171.10.113.1.5'),
+    (
+        'Cisco IOS Software, C2960 Software (C2960-LANBASEK9-M), '
+        'Version 12.2(55)SE5, RELEASE SOFTWARE (fc1)',
+        '.1.3.6.1.4.1.9.1.1208'
+    ),
+]
+
+
+class SnmpAgentFleet:
+    """
+    Класс моделирует snmp агенты на любом количестве адресов loopback
+    через один udp сокет: адрес назначения запроса определяется
+    по IP_PKTINFO, ответ отправляется с этого же адреса. Агенты отвечают
+    на запросы sysName, sysDescr и sysObjectID с заданной задержкой,
+    часть запросов с вероятностью loss остается без ответа.
+    """
+    def __init__(
+        self,
+        port: int,
+        latency: float = 0.0,
+        loss: float = 0.0,
+        host: str = '0.0.0.0'
+    ):
+        self.port = port
+        self.latency = latency
+        self.loss = loss
+        self.host = host
+        self.requests = 0
+        self.sock: Optional[socket.socket] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def __aenter__(self) -> 'SnmpAgentFleet':
+        self.loop = asyncio.get_running_loop()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.setsockopt(socket.IPPROTO_IP, IP_PKTINFO, 1)
+        self.sock.setblocking(False)
+        self.sock.bind((self.host, self.port))
+        self.loop.add_reader(self.sock.fileno(), self._read)
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+    @staticmethod
+    def values(host: str, oid: str) -> Any:
+        """
+        Функция возвращает значение переменной агента по адресу
+        """
+        index = int.from_bytes(socket.inet_aton(host), 'big') % len(DEVICES)
+        descr, objectid = DEVICES[index]
+        if oid == SYS_NAME:
+            return f'dev-{host}'
+        if oid == SYS_DESCR:
+            return descr
+        if oid == SYS_OBJECT_ID:
+            return objectid
+        return None
+
+    def _read(self) -> None:
+        while True:
+            try:
+                data, ancdata, _, addr = self.sock.recvmsg(
+                    4096, socket.CMSG_SPACE(12)
+                )
+            except (BlockingIOError, InterruptedError):
+                return
+            self.requests += 1
+            if self.loss and random.random() < self.loss:
+                continue
+            destination = None
+            for level, kind, cdata in ancdata:
+                if level == socket.IPPROTO_IP and kind == IP_PKTINFO:
+                    destination = cdata[4:8]
+            if destination is None:
+                continue
+            host = socket.inet_ntoa(destination)
+            try:
+                community, _, request_id, _, _, varbinds = ber.decode_message(data)
+            except Exception:
+                continue
+            response = ber.encode_message(
+                community,
+                ber.GET_RESPONSE,
+                request_id,
+                [(oid, self.values(host, oid)) for oid, _ in varbinds]
+            )
+            if self.latency:
+                self.loop.call_later(
+                    self.latency, self._send, response, destination, addr
+                )
+            else:
+                self._send(response, destination, addr)
+
+    def _send(self, response: bytes, destination: bytes, addr: Tuple) -> None:
+        pktinfo = struct.pack('@i4s4s', 0, destination, b'\0' * 4)
+        try:
+            self.sock.sendmsg(
+                [response], [(socket.IPPROTO_IP, IP_PKTINFO, pktinfo)], 0, addr
+            )
+        except OSError:
+            pass
+
+
+class TelnetServer:
+    """
+    Класс моделирует командную строку MikroTik по telnet на всех адресах
+    loopback. Каждый ответ устройства задерживается на latency секунд,
+    с вероятностью loss соединение закрывается сразу после установления.
+    """
+    PROMPT = b'\x1b[m[admin@MikroTik] > '
+
+    def __init__(
+        self,
+        port: int,
+        latency: float = 0.0,
+        loss: float = 0.0,
+        host: str = '0.0.0.0'
+    ):
+        self.port = port
+        self.latency = latency
+        self.loss = loss
+        self.host = host
+        self.sessions = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def __aenter__(self) -> 'TelnetServer':
+        self.server = await asyncio.start_server(
+            self.handle, self.host, self.port, backlog=4096
+        )
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        self.server.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, data: bytes) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        writer.write(data)
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.sessions += 1
+        if self.loss and random.random() < self.loss:
+            writer.close()
+            return
+
+        async def readline() -> str:
+            data = b''
+            while not data.endswith(b'\n'):
+                char = await reader.read(1)
+                if not char:
+                    raise ConnectionError
+                # Согласование параметров telnet пропускается
+                if char == b'\xff':
+                    await reader.read(2)
+                    continue
+                data += char
+            return data.decode(errors='replace').strip()
+
+        try:
+            await self._respond(writer, b'\r\n\r\nLogin: ')
+            await readline()
+            await self._respond(writer, b'Password: ')
+            await readline()
+            await self._respond(writer, b'\r\n' + self.PROMPT)
+            while True:
+                command = await readline()
+                await self._respond(
+                    writer,
+                    command.encode() + b'\r\n'
+                    + b'result of ' + command.encode() + b'\r\n\r\n'
+                    + self.PROMPT
+                )
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
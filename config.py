@@ -1,28 +1,162 @@
 APP_TITLE = 'NDCE : Network Device Configuration Editor'
 
 SYS_OBJECT_IDS_DB = 'ndce/ids.json'
+# Собранный индекс базы идентификаторов: python -m ndce.oid
+SYS_OBJECT_IDS_INDEX = 'ndce/ids.idx'
+
+# Файл базы устройств sqlite
+DB_PATH = 'ndce.db'
+
+# Время, в течение которого устройство не опрашивается повторно
+# при инкрементальном сканировании, секунд
+RESCAN_TTL = 3600
+# Начальный и максимальный интервалы до повторного опроса
+# не ответившего адреса, секунд. Интервал удваивается после каждой неудачи
+NEGATIVE_CACHE_BACKOFF = 600
+NEGATIVE_CACHE_MAX_BACKOFF = 7 * 24 * 3600
+# Максимальное количество не ответивших адресов в кэше. При превышении
+# удаляются записи, дольше всех не обновлявшиеся
+NEGATIVE_CACHE_SIZE = 65536
 
 # Учетные данные для подключения по telnet и ssh
 USERNAME = 'admin'
 PASSWORD = 'admin'
 
-# Максимальное количество конкурентно выполняемых корутин
-MAX_CONCURRENT = 8
+# Максимальное количество одновременно опрашиваемых устройств.
+# Фактическое количество подбирается регулятором: растет, пока
+# ответы приходят без потерь, и уменьшается при потерях
+MAX_CONCURRENT = 256
+CONCURRENCY_MIN = 8
+CONCURRENCY_INITIAL = 32
+# Прирост ограничения за окно ответов и множитель при потере
+AIMD_INCREASE = 1
+AIMD_DECREASE = 0.5
+# Общее ограничение частоты отправки пакетов опроса (icmp, snmp,
+# tcp соединения) в секунду, None - без ограничения
+PROBE_RATE = 10000
+# Количество пакетов, отправляемых без ожидания после простоя
+PROBE_BURST = 500
+
+# Количество процессов обнаружения устройств, None - по числу ядер.
+# Несколько процессов используются для подсетей не меньше
+# DISCOVERY_SHARD_MIN_HOSTS адресов, адреса распределяются между ними
+# порциями по DISCOVERY_CHUNK_SIZE
+DISCOVERY_PROCESSES = None
+DISCOVERY_SHARD_MIN_HOSTS = 65536
+DISCOVERY_CHUNK_SIZE = 1024
+# Интервал передачи результатов из процессов обнаружения, секунд
+DISCOVERY_FLUSH_INTERVAL = 0.2
 
 # Количество строк на странице
 ROWS_PER_PAGE = 50
-# Список вариантов количества строк на странице
-ROWS_COUNT_OPTIONS = [0, 25, 50, 100, 250, 500, 1000]
+# Список вариантов количества строк на странице.
+# Браузеру передается только текущая страница, вывод
+# всех устройств на одной странице не поддерживается
+ROWS_COUNT_OPTIONS = [25, 50, 100, 250, 500, 1000]
+
+# Интервал, с которым найденные устройства передаются в таблицу, секунд
+REFRESH_INTERVAL = 1
+# Количество накопленных устройств, при котором таблица
+# обновляется, не дожидаясь интервала
+REFRESH_BATCH_SIZE = 500
+# Интервал обновления панели метрик опроса, секунд
+METRICS_REFRESH_INTERVAL = 1
 
 SOCKET_TIMEOUT = 1
 
+TELNET_PORT = 23
+# Максимальное время установления соединения по telnet, секунд
+TELNET_CONNECT_TIMEOUT = 5
+# Максимальное время входа на устройство по telnet, секунд
+TELNET_LOGIN_TIMEOUT = 15
+# Максимальное время ожидания приглашения после команды, секунд
+TELNET_COMMAND_TIMEOUT = 10
+
+SSH_PORT = 22
+# Максимальное время установления соединения по ssh, секунд
+SSH_CONNECT_TIMEOUT = 10
+# Максимальное время от открытия канала до приглашения командной строки, секунд
+SSH_LOGIN_TIMEOUT = 15
+# Максимальное время ожидания вывода команды по ssh, секунд
+SSH_COMMAND_TIMEOUT = 10
+# Максимальное количество одновременных каналов в одном ssh соединении
+SSH_MAX_CHANNELS = 8
+# Тип терминала интерактивного канала
+SSH_TERM_TYPE = 'dumb'
+# Файл известных ключей устройств (known_hosts). По умолчанию (None)
+# ключи не проверяются и подмена устройства не обнаруживается,
+# проверка включается указанием файла
+SSH_KNOWN_HOSTS = None
+
+# Порядок выбора транспорта для передачи команд
+# из поддерживаемых устройством
+TRANSPORT_PRIORITY = ['telnet', 'ssh']
+
+# Повторное использование авторизованных сессий между передачами команд
+SESSION_POOL_ENABLED = True
+# Максимальное количество сохраняемых сессий
+SESSION_POOL_SIZE = 256
+# Время, после которого неиспользуемая сессия закрывается, секунд
+SESSION_IDLE_TIMEOUT = 300
+# Максимальное время проверки сессии перед повторным использованием, секунд
+SESSION_CHECK_TIMEOUT = 2
+
+# Количество устройств, которым команды передаются одновременно
+PUSH_WORKERS = 32
+# Максимальное время передачи команд одному устройству, секунд
+PUSH_TIMEOUT = 120
+# Количество строк на странице окна результатов передачи команд
+PUSH_RESULTS_PER_PAGE = 20
+
+# Поэтапная передача команд: размер контрольной группы,
+# коэффициент роста последующих волн и доля ошибок,
+# при превышении которой передача останавливается
+ROLLOUT_CANARY = 5
+ROLLOUT_GROWTH = 2
+ROLLOUT_MAX_FAILURE_RATE = 0.1
+# Порты tcp, проверяемые на обнаруженных устройствах
+PROBE_PORTS = [22, 23, 80, 443, 830]
+# Количество одновременно открываемых при проверке портов соединений.
+# Каждое занимает файловый дескриптор, ограничение процесса часто 1024
+PROBE_CONNECTIONS = 512
+
+# Таймаут и количество попыток icmp и snmp до получения первых ответов.
+# Далее они вычисляются по оценке времени ответа и потерь в подсети
 PING_TIMEOUT = 1
 PING_RETRIES = 5
+# Количество узлов, опрашиваемых по icmp одной группой через общий сокет
+PING_BATCH_SIZE = 256
+# Размер буфера приема общего icmp сокета, байт
+PING_SOCKET_BUFFER = 4 * 1024 * 1024
 
 SNMP_TIMEOUT = 1
 SNMP_RETRIES = 1
 SNMP_PORT = 161
 SNMP_COMMUNITY = 'public'
+# Количество общих udp сокетов для всех snmp запросов процесса
+SNMP_SOCKETS = 1
+
+# Адаптивные таймауты и повторы: False - всегда используются
+# значения PING_TIMEOUT, PING_RETRIES, SNMP_TIMEOUT и SNMP_RETRIES
+RTT_ADAPTIVE = True
+# Длина префикса подсети, для которой ведется отдельная оценка
+RTT_PREFIX = 24
+RTT_PREFIX6 = 64
+# Границы вычисленного таймаута, секунд
+RTT_MIN_TIMEOUT = 0.05
+RTT_MAX_TIMEOUT = 5
+# Минимальное время ожидания последней попытки для узла подсети,
+# из которой еще не было ответов, секунд
+RTT_EXPLORE_TIMEOUT = 2
+# Границы вычисленного количества попыток
+RTT_MIN_ATTEMPTS = 2
+RTT_MAX_ATTEMPTS = 6
+# Допустимая вероятность не получить ответ доступного узла из-за потерь
+RTT_TARGET_MISS = 0.01
+# Количество ответов, после которого доля потерь считается известной
+RTT_MIN_SAMPLES = 20
+# Количество ответов, после которого вес старых наблюдений уменьшается
+RTT_LOSS_WINDOW = 1000
 
 SNMP_SYS_NAME = '1.3.6.1.2.1.1.5.0'
 SNMP_SYS_DESCR = '1.3.6.1.2.1.1.1.0'
@@ -36,6 +170,9 @@ MKT_SYS_OBJECT_IDS = [
     '.1.3.6.1.4.1.14988.2'
 ]
 
+# Количество запоминаемых результатов разбора описаний устройств
+DESCR_CACHE_SIZE = 4096
+
 # Описание столбцов таблицы устройств
 COLUMNS_SETTINGS = [
     {
@@ -73,6 +210,13 @@ COLUMNS_SETTINGS = [
         'sortable': True,
         'required': True
     },
+    {
+        'name': 'firmware',
+        'label': 'Прошивка',
+        'field': 'firmware',
+        'sortable': True,
+        'required': True
+    },
     {
         'name': 'category',
         'label': 'Категория',
@@ -92,6 +236,12 @@ COLUMNS_SETTINGS = [
         'field': 'ssh',
         'required': True
     },
+    {
+        'name': 'ports',
+        'label': 'Порты',
+        'field': 'ports',
+        'required': True
+    },
 ]
 
 # Значения по-умолчанию для столбцов таблицы устройств
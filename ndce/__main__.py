@@ -0,0 +1,127 @@
+"""
+Обнаружение устройств без графического интерфейса:
+
+    python -m ndce discover 10.0.0.0/16 [10.1.0.0/24 ...] [-p PROCESSES]
+
+Каждое обнаруженное устройство выводится сразу отдельной строкой JSON
+(NDJSON) в стандартный вывод, итоги - строкой JSON в поток ошибок.
+Код завершения: 0 - обнаружено хотя бы одно устройство, 1 - устройства
+не обнаружены, 2 - неверные аргументы, 3 - не удалось открыть icmp сокет
+или процессы обнаружения прерваны до опроса всех адресов, 130 - прервано
+пользователем.
+"""
+from typing import List, Optional
+import argparse
+import contextlib
+import json
+import sys
+
+
+EXIT_OK = 0
+EXIT_NOT_FOUND = 1
+EXIT_USAGE = 2
+EXIT_FAILED = 3
+EXIT_INTERRUPTED = 130
+
+
+def discover(
+    subnets: List[str],
+    workers: Optional[int] = None,
+    processes: Optional[int] = 1
+) -> int:
+    """
+    Функция обнаруживает устройства в заданных подсетях
+    и возвращает код завершения
+    """
+    # Модули опроса импортируются только при запуске обнаружения,
+    # чтобы вывод справки и проверка аргументов не тратили на них время
+    import asyncio
+    import itertools
+    import time
+    from ndce.discovery import discover_hosts
+    from ndce.net import get_hosts_from_subnet
+    from ndce.shard import ShardedDiscovery
+
+    output = sys.stdout
+    totals = {'targets': 0, 'devices': 0, 'unreachable': 0, 'seconds': 0.0}
+    started = time.monotonic()
+
+    def counted(hosts):
+        for host in hosts:
+            totals['targets'] += 1
+            yield host
+
+    def on_device(row) -> None:
+        totals['devices'] += 1
+        output.write(json.dumps(row, ensure_ascii=False) + '\n')
+        output.flush()
+
+    def on_failed(_: str) -> None:
+        totals['unreachable'] += 1
+
+    targets = counted(
+        itertools.chain.from_iterable(map(get_hosts_from_subnet, subnets))
+    )
+    code = EXIT_OK
+    # Диагностика модулей выводится в поток ошибок,
+    # стандартный вывод содержит только записи об устройствах
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            if processes == 1:
+                asyncio.run(
+                    discover_hosts(targets, on_device, on_failed, workers=workers)
+                )
+            else:
+                asyncio.run(
+                    ShardedDiscovery(processes, workers).run(
+                        targets, on_device, on_failed
+                    )
+                )
+        except KeyboardInterrupt:
+            code = EXIT_INTERRUPTED
+        except ConnectionError as err:
+            print(err, file=sys.stderr)
+            code = EXIT_FAILED
+    totals['seconds'] = round(time.monotonic() - started, 3)
+    print(json.dumps(totals), file=sys.stderr)
+    if code == EXIT_OK and not totals['devices']:
+        code = EXIT_NOT_FOUND
+    return code
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m ndce',
+        description='NDCE : Network Device Configuration Editor',
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    discover_parser = commands.add_parser(
+        'discover', help='обнаружение устройств с выводом в формате NDJSON'
+    )
+    discover_parser.add_argument(
+        'subnets', nargs='+', metavar='SUBNET', help='подсеть, например 10.0.0.0/24'
+    )
+    discover_parser.add_argument(
+        '-w', '--workers', type=int, default=None,
+        help='количество одновременно опрашиваемых устройств, '
+             'по умолчанию подбирается автоматически',
+    )
+    discover_parser.add_argument(
+        '-p', '--processes', type=int, default=1,
+        help='количество процессов обнаружения, 0 - по числу ядер',
+    )
+    args = parser.parse_args(argv)
+
+    import ipaddress
+    for subnet in args.subnets:
+        try:
+            ipaddress.ip_network(subnet)
+        except ValueError as err:
+            parser.print_usage(sys.stderr)
+            print(f'{parser.prog}: error: {err}', file=sys.stderr)
+            return EXIT_USAGE
+    return discover(args.subnets, args.workers, args.processes or None)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
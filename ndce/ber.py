@@ -0,0 +1,204 @@
+from typing import Any, List, Tuple
+import ipaddress
+
+
+# Типы данных ASN.1 BER, используемые протоколом snmp
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIME_TICKS = 0x43
+OPAQUE = 0x44
+COUNTER64 = 0x46
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+
+# Типы PDU протокола snmp v2c
+GET_REQUEST = 0xa0
+GET_NEXT_REQUEST = 0xa1
+GET_RESPONSE = 0xa2
+REPORT = 0xa8
+
+SNMP_VERSION_2C = 1
+
+
+def encode_length(length: int) -> bytes:
+    """
+    Функция кодирует длину поля
+    """
+    if length < 0x80:
+        return bytes([length])
+    data = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(data)]) + data
+
+
+def encode_tlv(tag: int, value: bytes) -> bytes:
+    """
+    Функция кодирует поле в формате тип-длина-значение
+    """
+    return bytes([tag]) + encode_length(len(value)) + value
+
+
+def encode_integer(value: int, tag: int = INTEGER) -> bytes:
+    """
+    Функция кодирует целое число
+    """
+    length = max(1, (value.bit_length() + 8) // 8)
+    return encode_tlv(tag, value.to_bytes(length, 'big', signed=True))
+
+
+def encode_oid(oid: str) -> bytes:
+    """
+    Функция кодирует идентификатор объекта
+    """
+    parts = [int(part) for part in oid.strip('.').split('.')]
+    data = bytearray([parts[0] * 40 + parts[1]])
+    for part in parts[2:]:
+        chunk = [part & 0x7f]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7f))
+            part >>= 7
+        data.extend(reversed(chunk))
+    return encode_tlv(OBJECT_IDENTIFIER, bytes(data))
+
+
+def encode_value(value: Any) -> bytes:
+    """
+    Функция кодирует значение переменной
+    """
+    if value is None:
+        return encode_tlv(NULL, b'')
+    if isinstance(value, bool):
+        return encode_integer(int(value))
+    if isinstance(value, int):
+        return encode_integer(value)
+    if isinstance(value, str) and value.startswith('.'):
+        return encode_oid(value)
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return encode_tlv(OCTET_STRING, value)
+
+
+def encode_message(
+    community: str,
+    pdu_type: int,
+    request_id: int,
+    varbinds: List[Tuple[str, Any]],
+    error_status: int = 0,
+    error_index: int = 0
+) -> bytes:
+    """
+    Функция кодирует сообщение snmp v2c
+    """
+    bindings = b''.join(
+        encode_tlv(SEQUENCE, encode_oid(oid) + encode_value(value))
+        for oid, value in varbinds
+    )
+    pdu = encode_tlv(
+        pdu_type,
+        encode_integer(request_id)
+        + encode_integer(error_status)
+        + encode_integer(error_index)
+        + encode_tlv(SEQUENCE, bindings)
+    )
+    return encode_tlv(
+        SEQUENCE,
+        encode_integer(SNMP_VERSION_2C)
+        + encode_tlv(OCTET_STRING, community.encode('utf-8'))
+        + pdu
+    )
+
+
+def decode_tlv(data: bytes, offset: int = 0) -> Tuple[int, bytes, int]:
+    """
+    Функция декодирует поле и возвращает тип, значение и смещение
+    следующего поля
+    """
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7f
+        length = int.from_bytes(data[offset:offset + size], 'big')
+        offset += size
+    if offset + length > len(data):
+        raise ValueError('Некорректная длина поля')
+    return tag, data[offset:offset + length], offset + length
+
+
+def decode_sequence(data: bytes) -> List[Tuple[int, bytes]]:
+    """
+    Функция декодирует последовательность полей
+    """
+    items = []
+    offset = 0
+    while offset < len(data):
+        tag, value, offset = decode_tlv(data, offset)
+        items.append((tag, value))
+    return items
+
+
+def decode_oid(data: bytes) -> str:
+    """
+    Функция декодирует идентификатор объекта в формат '.1.3.6.1'
+    """
+    if not data:
+        return ''
+    parts = list(divmod(data[0], 40)) if data[0] < 80 else [2, data[0] - 80]
+    value = 0
+    for byte in data[1:]:
+        value = (value << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return '.' + '.'.join(map(str, parts))
+
+
+def decode_value(tag: int, data: bytes) -> Any:
+    """
+    Функция декодирует значение переменной
+    """
+    if tag == INTEGER:
+        return int.from_bytes(data, 'big', signed=True)
+    if tag in (COUNTER32, GAUGE32, TIME_TICKS, COUNTER64):
+        return int.from_bytes(data, 'big')
+    if tag == OBJECT_IDENTIFIER:
+        return decode_oid(data)
+    if tag == IP_ADDRESS:
+        return str(ipaddress.IPv4Address(data))
+    if tag in (OCTET_STRING, OPAQUE):
+        return data
+    # NULL, noSuchObject, noSuchInstance, endOfMibView
+    return None
+
+
+def decode_message(data: bytes) -> Tuple[str, int, int, int, int, List[Tuple[str, Any]]]:
+    """
+    Функция декодирует сообщение snmp v2c и возвращает community,
+    тип PDU, идентификатор запроса, статус и индекс ошибки и переменные
+    """
+    tag, message, _ = decode_tlv(data)
+    if tag != SEQUENCE:
+        raise ValueError('Некорректное сообщение snmp')
+    (_, version), (_, community), (pdu_type, pdu) = decode_sequence(message)
+    (_, request_id), (_, error_status), (_, error_index), (_, bindings) = (
+        decode_sequence(pdu)
+    )
+    varbinds = []
+    for _, binding in decode_sequence(bindings):
+        (_, oid), (value_tag, value) = decode_sequence(binding)
+        varbinds.append((decode_oid(oid), decode_value(value_tag, value)))
+    return (
+        community.decode('utf-8', 'replace'),
+        pdu_type,
+        int.from_bytes(request_id, 'big', signed=True),
+        int.from_bytes(error_status, 'big'),
+        int.from_bytes(error_index, 'big'),
+        varbinds
+    )
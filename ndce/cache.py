@@ -0,0 +1,96 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import time
+import config
+
+
+class NegativeCache:
+    """
+    Класс хранит адреса, не ответившие при обнаружении.
+    Повторный опрос адреса откладывается с экспоненциально
+    растущим интервалом после каждой неудачи.
+    Кэш хранит не более max_entries адресов: при превышении удаляются
+    записи, дольше всех не обновлявшиеся.
+    """
+    def __init__(
+        self,
+        entries: Iterable[Tuple[str, int, float]] = (),
+        backoff: Optional[float] = config.NEGATIVE_CACHE_BACKOFF,
+        max_backoff: Optional[float] = config.NEGATIVE_CACHE_MAX_BACKOFF,
+        max_entries: Optional[int] = config.NEGATIVE_CACHE_SIZE
+    ):
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_entries = max(1, max_entries)
+        # Адрес -> (количество неудач подряд, время следующего опроса)
+        # в порядке обновления записей
+        self._entries: Dict[str, Tuple[int, float]] = {
+            host: (failures, next_probe) for host, failures, next_probe in entries
+        }
+        self._changed: Set[str] = set()
+        self._removed: Set[str] = set()
+        # Записи сверх ограничения удаляются и из базы
+        self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, host: str) -> bool:
+        return host in self._entries
+
+    def should_probe(self, host: str, now: Optional[float] = None) -> bool:
+        """
+        Функция определяет, истек ли интервал ожидания для адреса
+        """
+        entry = self._entries.get(host)
+        if entry is None:
+            return True
+        return (time.time() if now is None else now) >= entry[1]
+
+    def failed(self, host: str, now: Optional[float] = None) -> None:
+        """
+        Функция фиксирует неудачный опрос адреса
+        """
+        now = time.time() if now is None else now
+        failures = self._entries.pop(host, (0, 0))[0] + 1
+        delay = min(self.backoff * 2 ** min(failures - 1, 32), self.max_backoff)
+        self._entries[host] = (failures, now + delay)
+        self._changed.add(host)
+        self._removed.discard(host)
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            host = next(iter(self._entries))
+            del self._entries[host]
+            self._changed.discard(host)
+            self._removed.add(host)
+
+    def succeeded(self, host: str) -> None:
+        """
+        Функция удаляет ответивший адрес из кэша
+        """
+        if self._entries.pop(host, None) is not None:
+            self._removed.add(host)
+            self._changed.discard(host)
+
+    def clear(self) -> None:
+        """
+        Функция очищает кэш
+        """
+        self._removed.update(self._entries)
+        self._entries.clear()
+        self._changed.clear()
+
+    def changes(self) -> Tuple[List[Tuple[str, int, float]], List[str]]:
+        """
+        Функция возвращает измененные и удаленные с прошлого вызова записи
+        """
+        changed = [
+            (host, *self._entries[host])
+            for host in self._changed
+            if host in self._entries
+        ]
+        removed = list(self._removed)
+        self._changed.clear()
+        self._removed.clear()
+        return changed, removed
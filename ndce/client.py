@@ -0,0 +1,86 @@
+from typing import Any, Hashable, List, Optional, Tuple
+import abc
+from ndce.expect import Expect, get_profile
+from ndce import metrics
+import config
+
+
+class DeviceUnreachable(ConnectionError):
+    """
+    Устройство не принимает соединение
+    """
+
+
+class Client(abc.ABC):
+    """
+    Базовый класс транспорта командной строки устройства.
+    Наследники реализуют установление соединения и вход на устройство,
+    передача команд и работа с пулом сессий общие для всех транспортов.
+    """
+    transport = ''
+
+    def __init__(
+        self,
+        ip: str,
+        username: Optional[str] = config.USERNAME,
+        password: Optional[str] = config.PASSWORD,
+        commands: Optional[List[str]] = None,
+        sysobjectid: Optional[str] = None,
+        port: Optional[int] = None
+    ):
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+        self.commands = commands or []
+        # Профиль приглашений выбирается по system object id устройства
+        self.profile = get_profile(sysobjectid)
+        self.outputs: List[Tuple[str, str]] = []
+
+    @property
+    def key(self) -> Hashable:
+        """
+        Ключ сессии в пуле
+        """
+        return (self.transport, self.ip, self.port, self.username)
+
+    @abc.abstractmethod
+    async def login(self) -> Expect:
+        """
+        Функция устанавливает соединение, выполняет вход на устройство
+        и возвращает сессию
+        """
+
+    async def exec_commands(self, pool: Optional[Any] = None) -> List[Tuple[str, str]]:
+        """
+        Функция выполняет независимые друг от друга команды и возвращает
+        список пар команда - вывод. Транспорт без одновременного выполнения
+        команд передает их по очереди в одной сессии.
+        """
+        return await self.cli_connect(pool)
+
+    async def cli_connect(self, pool: Optional[Any] = None) -> List[Tuple[str, str]]:
+        """
+        Функция передает команды устройству и возвращает список пар
+        команда - вывод. При ошибке соединения или входа вызывается исключение.
+        Если задан пул сессий, авторизованная сессия берется из пула
+        и возвращается в него после выполнения команд.
+        """
+        session = await pool.acquire(self.key) if pool is not None else None
+        if session is None:
+            session = await self.login()
+        try:
+            for command in self.commands:
+                if not command.strip():
+                    continue
+                with metrics.measure(f'{self.transport}_command'):
+                    output = await session.command(command)
+                self.outputs.append((command.strip(), output))
+        except BaseException:
+            session.close()
+            raise
+        if pool is not None:
+            pool.release(self.key, session)
+        else:
+            session.close()
+        return self.outputs
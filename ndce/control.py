@@ -0,0 +1,165 @@
+from typing import Deque, Optional
+import asyncio
+import collections
+import time
+from ndce import metrics
+import config
+
+
+class TokenBucket:
+    """
+    Класс ограничивает количество отправляемых пакетов в секунду.
+    Пакет, для которого не хватает токенов, берет их в долг и ожидает
+    погашения долга, поэтому одновременные отправители выстраиваются
+    в очередь с равными интервалами.
+    """
+    def __init__(
+        self,
+        rate: Optional[int | float] = config.PROBE_RATE,
+        burst: Optional[int] = config.PROBE_BURST
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    async def take(self, tokens: int = 1) -> None:
+        """
+        Функция дожидается возможности отправить заданное количество пакетов
+        """
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= tokens
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class AimdController:
+    """
+    Класс ограничивает количество одновременно опрашиваемых устройств
+    и подбирает ограничение так же, как tcp подбирает окно перегрузки.
+    До первой потери ограничение растет на единицу с каждым ответом,
+    затем - на единицу за каждые limit ответов. При потере ограничение
+    уменьшается в AIMD_DECREASE раз, но не чаще раза за окно запросов.
+    Потерей считается ответ на повторный запрос и опоздавший ответ;
+    молчание узла потерей не считается: по нему нельзя отличить
+    перегрузку от отсутствия устройства.
+    """
+    def __init__(
+        self,
+        initial: Optional[int] = config.CONCURRENCY_INITIAL,
+        minimum: Optional[int] = config.CONCURRENCY_MIN,
+        maximum: Optional[int] = config.MAX_CONCURRENT
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        # Порог, до которого ограничение растет быстро
+        self.threshold = float(self.maximum)
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        self._signals = 0
+        # Номер сигнала, до которого ограничение повторно не уменьшается
+        self._hold = 0
+        metrics.CONCURRENCY_LIMIT.set(self.concurrency)
+
+    @property
+    def concurrency(self) -> int:
+        return int(self.limit)
+
+    async def __aenter__(self) -> 'AimdController':
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.release()
+
+    async def acquire(self) -> None:
+        """
+        Функция дожидается освобождения места среди опрашиваемых устройств
+        """
+        while self.in_flight >= self.concurrency:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Освободившееся место передается следующему
+                    self._wake()
+                else:
+                    self._waiters.remove(waiter)
+                raise
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        free = self.concurrency - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def success(self) -> None:
+        """
+        Функция учитывает ответ, полученный на первый запрос
+        """
+        self._signals += 1
+        # Ограничение, которое не используется, не увеличивается
+        if self.limit >= self.maximum or self.in_flight * 2 < self.limit:
+            return
+        if self.limit < self.threshold:
+            self.limit += 1
+        else:
+            self.limit += config.AIMD_INCREASE / self.limit
+        self.limit = min(self.maximum, self.limit)
+        metrics.CONCURRENCY_LIMIT.set(self.concurrency)
+        self._wake()
+
+    def congestion(self) -> None:
+        """
+        Функция учитывает признак перегрузки: потерянный или опоздавший ответ
+        """
+        self._signals += 1
+        metrics.CONGESTION_SIGNALS.inc()
+        if self._signals < self._hold:
+            return
+        self.limit = max(self.minimum, self.limit * config.AIMD_DECREASE)
+        self.threshold = self.limit
+        # Потери запросов, отправленных до уменьшения, повторно
+        # ограничение не уменьшают
+        self._hold = self._signals + max(self.in_flight, self.concurrency)
+        metrics.CONCURRENCY_LIMIT.set(self.concurrency)
+
+
+_controller: Optional[AimdController] = None
+_bucket: Optional[TokenBucket] = None
+
+
+def get_controller() -> AimdController:
+    """
+    Функция возвращает общий для процесса регулятор количества
+    одновременно опрашиваемых устройств. Подобранное ограничение
+    сохраняется между сеансами обнаружения.
+    """
+    global _controller
+    if _controller is None:
+        _controller = AimdController()
+    return _controller
+
+
+def get_rate_limiter() -> TokenBucket:
+    """
+    Функция возвращает общее для процесса ограничение частоты пакетов
+    """
+    global _bucket
+    if _bucket is None:
+        _bucket = TokenBucket()
+    return _bucket
@@ -0,0 +1,169 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import json
+import sqlite3
+import config
+
+
+class DeviceDatabase:
+    """
+    Класс хранит базу устройств в sqlite.
+    Каждое устройство записывается отдельной строкой, поэтому добавление
+    и удаление затрагивают только измененные устройства. Поля, по которым
+    выполняется фильтрация, вынесены в индексированные столбцы.
+    """
+    INDEXED_FIELDS = ('category', 'vendor', 'model', 'telnet', 'ssh')
+
+    def __init__(self, path: Optional[str] = config.DB_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute(
+                '''
+                CREATE TABLE IF NOT EXISTS devices (
+                    host TEXT PRIMARY KEY,
+                    category TEXT,
+                    vendor TEXT,
+                    model TEXT,
+                    telnet INTEGER,
+                    ssh INTEGER,
+                    data TEXT NOT NULL
+                )
+                '''
+            )
+            for field in self.INDEXED_FIELDS:
+                self.connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS devices_{field} '
+                    f'ON devices ({field})'
+                )
+            # Адреса, не ответившие при обнаружении
+            self.connection.execute(
+                '''
+                CREATE TABLE IF NOT EXISTS unreachable (
+                    host TEXT PRIMARY KEY,
+                    failures INTEGER NOT NULL,
+                    next_probe REAL NOT NULL
+                )
+                '''
+            )
+
+    def close(self) -> None:
+        """
+        Функция закрывает соединение с базой
+        """
+        self.connection.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM devices').fetchone()[0]
+
+    @staticmethod
+    def _values(row: Dict[str, Any]) -> tuple:
+        return (
+            row['host'],
+            row.get('category'),
+            row.get('vendor'),
+            row.get('model'),
+            row.get('telnet'),
+            row.get('ssh'),
+            json.dumps(row, ensure_ascii=False)
+        )
+
+    def upsert(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Функция добавляет устройства или обновляет существующие
+        """
+        with self.connection:
+            self.connection.executemany(
+                '''
+                INSERT INTO devices
+                    (host, category, vendor, model, telnet, ssh, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (host) DO UPDATE SET
+                    category = excluded.category,
+                    vendor = excluded.vendor,
+                    model = excluded.model,
+                    telnet = excluded.telnet,
+                    ssh = excluded.ssh,
+                    data = excluded.data
+                ''',
+                map(self._values, rows)
+            )
+
+    def delete(self, hosts: Iterable[str]) -> None:
+        """
+        Функция удаляет устройства с заданными ip адресами
+        """
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM devices WHERE host = ?',
+                ((host,) for host in hosts)
+            )
+
+    def clear(self) -> None:
+        """
+        Функция удаляет все устройства и записи о не ответивших адресах
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM devices')
+            self.connection.execute('DELETE FROM unreachable')
+
+    def load(self) -> Iterator[Dict[str, Any]]:
+        """
+        Функция последовательно возвращает устройства в порядке добавления
+        """
+        cursor = self.connection.execute('SELECT data FROM devices ORDER BY rowid')
+        for (data,) in cursor:
+            yield json.loads(data)
+
+    def query(self, criteria: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Функция возвращает устройства, поля которых равны заданным значениям
+        """
+        fields = [field for field in criteria if field in self.INDEXED_FIELDS]
+        if len(fields) != len(criteria):
+            raise ValueError('Фильтрация возможна только по индексированным полям')
+        where = ' AND '.join(f'{field} = ?' for field in fields) or '1'
+        cursor = self.connection.execute(
+            f'SELECT data FROM devices WHERE {where} ORDER BY rowid',
+            [criteria[field] for field in fields]
+        )
+        return [json.loads(data) for (data,) in cursor]
+
+    def load_unreachable(self) -> List[Tuple[str, int, float]]:
+        """
+        Функция возвращает записи о не ответивших адресах
+        в порядке времени повторного опроса
+        """
+        return self.connection.execute(
+            'SELECT host, failures, next_probe FROM unreachable ORDER BY next_probe'
+        ).fetchall()
+
+    def save_unreachable(
+        self,
+        changed: Iterable[Tuple[str, int, float]],
+        removed: Iterable[str] = ()
+    ) -> None:
+        """
+        Функция сохраняет измененные и удаляет устаревшие записи
+        о не ответивших адресах
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO unreachable VALUES (?, ?, ?)', changed
+            )
+            self.connection.executemany(
+                'DELETE FROM unreachable WHERE host = ?',
+                ((host,) for host in removed)
+            )
+
+    def migrate(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Функция однократно переносит устройства из прежнего хранилища.
+        Перенос выполняется только в пустую базу.
+        """
+        if len(self):
+            return 0
+        rows = list(rows)
+        self.upsert(rows)
+        return len(rows)
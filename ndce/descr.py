@@ -0,0 +1,138 @@
+from typing import Any, Dict, List, Optional
+import functools
+import re
+import config
+
+
+# Правила разбора описания устройства (sysDescr): регулярные выражения,
+# извлекающие модель и версию прошивки. Правило выбирается по наиболее
+# длинной начальной части system object id устройства. Выражения
+# проверяются по порядку, используется первое совпадение.
+RULES: List[Dict[str, Any]] = [
+    {
+        # 'RouterOS RB750GL'
+        'name': 'MikroTik RouterOS',
+        'sysobjectids': [config.MKT_SYS_OBJECT_IDS[0]],
+        'model': [r'^RouterOS\s+(?P<model>.+?)\s*$'],
+        'firmware': [],
+    },
+    {
+        # 'RB260GS'
+        'name': 'MikroTik SwOS',
+        'sysobjectids': [config.MKT_SYS_OBJECT_IDS[1]],
+        'model': [r'^(?P<model>.+?)\s*$'],
+        'firmware': [],
+    },
+    {
+        # 'Cisco IOS Software, C2960 Software (C2960-LANBASEK9-M),
+        # Version 12.2(55)SE5, RELEASE SOFTWARE (fc1)'
+        'name': 'Cisco',
+        'sysobjectids': ['.1.3.6.1.4.1.9'],
+        'model': [r'\b(?P<model>[A-Z]+\d[\w\-]*) Software \(', r'^Cisco (?P<model>\S+)'],
+        'firmware': [r'Version (?P<firmware>[^\s,]+)'],
+    },
+    {
+        # 'DES-3200-28 Fast Ethernet Switch'
+        'name': 'D-Link',
+        'sysobjectids': ['.1.3.6.1.4.1.171'],
+        'model': [r'^(?P<model>D[A-Z]{2}-[\w\-/]+)'],
+        'firmware': [],
+    },
+    {
+        # 'SNR-S2985G-24T Device, Compiled Jul 31 21:45:02 2019
+        #   SoftWare Version 7.0.3.5(R0241.0222)'
+        'name': 'SNR',
+        'sysobjectids': ['.1.3.6.1.4.1.40418'],
+        'model': [r'^(?P<model>\S+) Device'],
+        'firmware': [r'SoftWare Version (?P<firmware>\S+)'],
+    },
+    {
+        # 'S5720-28X-PWR-SI-AC
+        #  Huawei Versatile Routing Platform Software
+        #  VRP (R) software,Version 5.170 (S5720 V200R011C10SPC600)'
+        'name': 'HUAWEI',
+        'sysobjectids': ['.1.3.6.1.4.1.2011'],
+        'model': [r'Quidway (?P<model>\S+)', r'^(?P<model>[A-Z]+\d[\w\-]*)\s*$'],
+        'firmware': [r'Version [\d.]+ \((?:\S+ )?(?P<firmware>V\d+R\w+)\)'],
+    },
+    {
+        # 'HP J9773A 2530-24G-PoEP Switch, revision YA.16.02.0012, ROM ...'
+        # 'HP V1910-24G Switch Software Version 5.20 Release 1513P95'
+        'name': 'HP',
+        'sysobjectids': ['.1.3.6.1.4.1.11', '.1.3.6.1.4.1.25506'],
+        'model': [r'HP (?:J\w{5} )?(?P<model>\S+) Switch'],
+        'firmware': [r'(?:revision|Version) (?P<firmware>[\w.]+)'],
+    },
+    {
+        # 'MES2324 28-port 1G/10G Managed Switch'
+        'name': 'ELTEX',
+        'sysobjectids': ['.1.3.6.1.4.1.35265'],
+        'model': [r'^(?P<model>MES\S+)'],
+        'firmware': [],
+    },
+    {
+        # 'GS1900-24'
+        'name': 'Zyxel',
+        'sysobjectids': ['.1.3.6.1.4.1.890'],
+        'model': [r'^(?P<model>[A-Z]+\d[\w\-]*)\s*$'],
+        'firmware': [],
+    },
+    {
+        'name': 'Default',
+        'sysobjectids': [],
+        'model': [],
+        'firmware': [r'(?i)\bversion\s+(?P<firmware>\d[\w.()\-]*)'],
+    },
+]
+
+
+def _compile(rule: Dict[str, Any]) -> Dict[str, Any]:
+    compiled = dict(rule)
+    for key in ('model', 'firmware'):
+        compiled[key] = [re.compile(pattern, re.MULTILINE) for pattern in rule[key]]
+    return compiled
+
+
+_RULES = [_compile(rule) for rule in RULES]
+_RULES_BY_NAME = {rule['name']: rule for rule in _RULES}
+
+
+@functools.lru_cache(maxsize=config.DESCR_CACHE_SIZE)
+def get_rule(sysobjectid: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Функция возвращает правило разбора описания по system object id
+    """
+    best, length = _RULES[-1], -1
+    if sysobjectid:
+        for rule in _RULES:
+            for prefix in rule['sysobjectids']:
+                if len(prefix) <= length:
+                    continue
+                if sysobjectid == prefix or sysobjectid.startswith(prefix + '.'):
+                    best, length = rule, len(prefix)
+    return best
+
+
+@functools.lru_cache(maxsize=config.DESCR_CACHE_SIZE)
+def _parse(name: str, description: str) -> Dict[str, str]:
+    rule = _RULES_BY_NAME[name]
+    description = description.replace('\r', '').strip()
+    result = {}
+    for key in ('model', 'firmware'):
+        for pattern in rule[key]:
+            match = pattern.search(description)
+            if match and match.group(key):
+                result[key] = match.group(key)
+                break
+    return result
+
+
+def parse_description(sysobjectid: Optional[str], description: str) -> Dict[str, str]:
+    """
+    Функция возвращает модель и версию прошивки, извлеченные из описания
+    устройства. Результаты запоминаются: одинаковые описания однотипных
+    устройств разбираются один раз.
+    """
+    if not description:
+        return {}
+    return dict(_parse(get_rule(sysobjectid)['name'], description))
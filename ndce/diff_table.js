@@ -0,0 +1,85 @@
+import { convertDynamicProperties } from "../../static/utils/dynamic_properties.js";
+
+// Таблица хранит строки на стороне браузера и принимает от сервера
+// только изменения: добавленные, измененные и удаленные строки.
+// Полный набор строк запрашивается при подключении и при пропуске изменений.
+export default {
+  template: `
+    <q-table ref="qRef" :columns="convertedColumns" :rows="localRows" @fullscreen="setFullscreenClass">
+      <template v-for="(_, slot) in $slots" v-slot:[slot]="slotProps">
+        <slot :name="slot" v-bind="slotProps || {}" />
+      </template>
+    </q-table>
+  `,
+  props: {
+    columns: Array,
+    // Строки передаются методами reset и patch, а не свойством
+    rows: Array,
+  },
+  data() {
+    return {
+      localRows: [],
+      version: -1,
+    };
+  },
+  computed: {
+    convertedColumns() {
+      this.columns.forEach((column) => convertDynamicProperties(column, false));
+      return this.columns;
+    },
+    rowKey() {
+      return this.$attrs["row-key"] ?? this.$attrs.rowKey ?? "id";
+    },
+  },
+  mounted() {
+    this.$emit("resync");
+  },
+  methods: {
+    reset(version, rows) {
+      this.localRows = rows;
+      this.version = version;
+      this.$emit("ack", version);
+    },
+    patch(base, version, upserts, deletes, order) {
+      if (this.version < base || (this.version > base && order === null)) {
+        this.$emit("resync");
+        return;
+      }
+      if (this.version >= version) {
+        return;
+      }
+      const key = this.rowKey;
+      const deleted = new Set(deletes);
+      const changed = new Map(upserts.map((row) => [row[key], row]));
+      const rows = [];
+      for (const row of this.localRows) {
+        if (deleted.has(row[key])) continue;
+        if (changed.has(row[key])) {
+          rows.push(changed.get(row[key]));
+          changed.delete(row[key]);
+        } else {
+          rows.push(row);
+        }
+      }
+      rows.push(...changed.values());
+      if (order !== null) {
+        const byKey = new Map(rows.map((row) => [row[key], row]));
+        this.localRows = order.map((k) => byKey.get(k)).filter((row) => row !== undefined);
+      } else {
+        this.localRows = rows;
+      }
+      this.version = version;
+      this.$emit("ack", version);
+    },
+    setFullscreenClass(isFullscreen) {
+      if (isFullscreen) {
+        document.documentElement.classList.add("nicegui-table-fullscreen");
+      } else {
+        setTimeout(() => document.documentElement.classList.remove("nicegui-table-fullscreen"));
+      }
+    },
+  },
+  unmounted() {
+    this.setFullscreenClass(false);
+  },
+};
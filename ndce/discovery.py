@@ -0,0 +1,82 @@
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, Optional
+import time
+from ndce.control import get_controller
+from ndce.icmp import sweep_hosts
+from ndce.net import probe_tcp_ports
+from ndce.pool import run_workers
+from ndce.snmp import get_device_info
+import config
+
+
+def make_row(
+    device: Dict[str, str],
+    ports: Dict[int, bool],
+    now: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Функция формирует запись об устройстве для базы
+    """
+    now = time.time() if now is None else now
+    return {
+        'host': device.get('host', 'Unknown'),
+        'sysobjectid': device.get('sysobjectid', 'Unknown'),
+        'hostname': device.get('hostname', 'Unknown'),
+        'vendor': device.get('vendor', 'Unknown'),
+        'model': device.get('model', 'Unknown'),
+        'firmware': device.get('firmware', 'Unknown'),
+        'category': device.get('category', 'Unknown'),
+        'telnet': ports.get(23, False),
+        'ssh': ports.get(22, False),
+        'ports': [port for port, is_open in ports.items() if is_open],
+        'last_seen': now,
+        'last_probe': now,
+    }
+
+
+async def probe_device(host: str) -> Optional[Dict[str, Any]]:
+    """
+    Функция опрашивает устройство по snmp, проверяет его tcp порты
+    и возвращает запись об устройстве или None, если оно не ответило
+    """
+    device = await get_device_info(host)
+    if not device:
+        return None
+    # Порты проверяются одновременно и не блокируют цикл событий
+    ports = await probe_tcp_ports(host)
+    return make_row(device, ports)
+
+
+async def discover_hosts(
+    targets: Iterable[str] | AsyncIterable[str],
+    on_device: Callable[[Dict[str, Any]], None],
+    on_failed: Optional[Callable[[str], None]] = None,
+    skip: Optional[Callable[[str], bool]] = None,
+    workers: Optional[int] = None
+) -> None:
+    """
+    Функция обнаруживает устройства среди заданных адресов.
+    Доступность узлов проверяется группами через общий icmp сокет,
+    по snmp опрашиваются только ответившие узлы. Для каждого
+    обнаруженного устройства вызывается функция on_device, для адресов,
+    не ответивших по icmp или snmp - функция on_failed. Адреса,
+    для которых функция skip возвращает True, не опрашиваются.
+    Если количество обработчиков не задано, оно подбирается регулятором
+    в пределах MAX_CONCURRENT.
+    """
+    hosts = sweep_hosts(targets, unreachable=on_failed)
+
+    async def handle(host: str) -> None:
+        if skip and skip(host):
+            return
+        row = await probe_device(host)
+        if row is not None:
+            on_device(row)
+        elif on_failed:
+            on_failed(host)
+
+    if workers:
+        await run_workers(hosts, handle, workers, 'discover')
+    else:
+        await run_workers(
+            hosts, handle, config.MAX_CONCURRENT, 'discover', get_controller()
+        )
@@ -0,0 +1,205 @@
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+import asyncio
+import re
+import config
+
+
+# Управляющие последовательности терминала, которые нужно убрать из вывода
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]|\x1b[=>]|\r')
+
+# Профили устройств: регулярные выражения приглашений ввода логина,
+# пароля и командной строки, признак постраничного вывода.
+# Приглашение командной строки ищется только в последней, незавершенной
+# строке вывода: строки вывода команды тоже могут оканчиваться на # или %.
+# Профиль выбирается по начальной части system object id устройства.
+PROFILES: List[Dict[str, Any]] = [
+    {
+        'name': 'MikroTik',
+        'sysobjectids': config.MKT_SYS_OBJECT_IDS,
+        'login': r'Login:\s*$',
+        'password': r'Password:\s*$',
+        'prompt': r'(?:^|\n)\[[^\]\n]+@[^\]\n]+\][ \t]*(/[^>\n]*)?>[ \t]*\Z',
+        'pager': r'-- \[Q quit\|.*?\]',
+        # Суффиксы логина отключают цвета и определение терминала
+        'username_suffix': '+ct',
+    },
+    {
+        'name': 'Default',
+        'sysobjectids': [],
+        'login': r'(?i)(user\s*name|login)\s*:\s*$',
+        'password': r'(?i)password\s*:\s*$',
+        'prompt': r'(?:^|\n)[\w\-.@()\[\]/:~ ]+[>#$%][ \t]*\Z',
+        'pager': r'(?i)-+\s*more\s*-+|--more--',
+        'username_suffix': '',
+    },
+]
+
+
+def _compile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    compiled = dict(profile)
+    for key in ('login', 'password', 'prompt', 'pager'):
+        compiled[key] = re.compile(profile[key])
+    return compiled
+
+
+_PROFILES = [_compile(profile) for profile in PROFILES]
+
+
+def get_profile(sysobjectid: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Функция возвращает профиль устройства по его system object id
+    """
+    if sysobjectid:
+        for profile in _PROFILES:
+            for prefix in profile['sysobjectids']:
+                if sysobjectid == prefix or sysobjectid.startswith(prefix + '.'):
+                    return profile
+    return _PROFILES[-1]
+
+
+class PromptTimeout(asyncio.TimeoutError):
+    """
+    Устройство не вывело ожидаемое приглашение за таймаут сессии
+    """
+
+
+class Expect:
+    """
+    Класс ведет диалог с устройством по приглашениям командной строки:
+    каждая команда отправляется сразу после появления приглашения,
+    вывод собирается полностью до следующего приглашения
+    """
+    def __init__(
+        self,
+        reader: Any,
+        writer: Any,
+        profile: Optional[Dict[str, Any]] = None,
+        timeout: Optional[int | float] = config.TELNET_COMMAND_TIMEOUT
+    ):
+        self.reader = reader
+        self.writer = writer
+        self.profile = profile or get_profile()
+        self.timeout = timeout
+        self.buffer = ''
+
+    async def expect(
+        self,
+        patterns: List[Pattern],
+        timeout: Optional[int | float] = None
+    ) -> Tuple[int, str]:
+        """
+        Функция ожидает появления одного из шаблонов в выводе устройства
+        и возвращает номер шаблона и вывод до конца совпадения включительно.
+        Если шаблон не появился за timeout, вызывается исключение
+        PromptTimeout.
+        """
+        loop = asyncio.get_running_loop()
+        timeout = timeout or self.timeout
+        deadline = loop.time() + timeout
+        position = 0
+        while True:
+            for index, pattern in enumerate(patterns):
+                match = pattern.search(self.buffer, position)
+                if match:
+                    text = self.buffer[:match.end()]
+                    self.buffer = self.buffer[match.end():]
+                    return index, text
+            try:
+                data = await asyncio.wait_for(
+                    self.reader.read(4096), max(0, deadline - loop.time())
+                )
+            except asyncio.TimeoutError as err:
+                raise PromptTimeout(
+                    f'Не дождались приглашения устройства за {timeout} с'
+                ) from err
+            if not data:
+                raise ConnectionError('Соединение закрыто устройством')
+            # Поиск продолжается с конца уже просмотренного вывода
+            # с запасом на совпадение, начавшееся в предыдущей порции
+            position = max(0, len(self.buffer) - 256)
+            self.buffer += ANSI_ESCAPE.sub('', data)
+
+    def is_open(self) -> bool:
+        """
+        Функция проверяет, что соединение с устройством не закрыто
+        """
+        if self.writer.is_closing():
+            return False
+        return not self.reader.at_eof()
+
+    def close(self) -> None:
+        """
+        Функция закрывает соединение с устройством
+        """
+        self.writer.close()
+
+    async def check(self, timeout: Optional[int | float] = None) -> bool:
+        """
+        Функция проверяет работоспособность сессии: на пустую строку
+        устройство должно ответить приглашением командной строки
+        """
+        if not self.is_open():
+            return False
+        try:
+            self.send('')
+            await self.expect([self.profile['prompt']], timeout)
+            return True
+        except Exception:
+            return False
+
+    def send(self, line: str) -> None:
+        """
+        Функция отправляет строку устройству
+        """
+        self.writer.write(line.rstrip('\r\n') + '\r\n')
+
+    async def login(self, username: str, password: str) -> None:
+        """
+        Функция выполняет вход на устройство и дожидается
+        приглашения командной строки
+        """
+        profile = self.profile
+        patterns = [profile['login'], profile['password'], profile['prompt']]
+        username_sent = False
+        password_sent = False
+        while True:
+            index, _ = await self.expect(patterns)
+            if index == 0:
+                if username_sent:
+                    raise PermissionError('Неверные учетные данные')
+                self.send(username + profile['username_suffix'])
+                username_sent = True
+            elif index == 1:
+                if password_sent:
+                    raise PermissionError('Неверные учетные данные')
+                self.send(password)
+                password_sent = True
+            else:
+                return
+
+    async def command(
+        self, command: str, timeout: Optional[int | float] = None
+    ) -> str:
+        """
+        Функция выполняет команду и возвращает ее вывод
+        без эха команды и завершающего приглашения
+        """
+        profile = self.profile
+        self.send(command)
+        output = ''
+        while True:
+            index, text = await self.expect(
+                [profile['prompt'], profile['pager']], timeout
+            )
+            if index == 1:
+                # Постраничный вывод: запрашиваем следующую страницу
+                output += profile['pager'].sub('', text)
+                self.writer.write(' ')
+                continue
+            output += profile['prompt'].sub('', text)
+            break
+        lines = output.split('\n')
+        # Первая строка - эхо отправленной команды
+        if lines and lines[0].strip() == command.strip():
+            lines = lines[1:]
+        return '\n'.join(lines).strip('\n')
@@ -1,24 +1,377 @@
-from typing import Optional, Tuple
+from typing import (
+    AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional,
+    Set, Tuple
+)
 import asyncio
-import aioping
+import itertools
+import os
+import socket
+import struct
+import time
+from ndce import metrics
+from ndce.control import get_controller, get_rate_limiter
+from ndce.rtt import RttTable, icmp_rtt
 import config
 
 
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+
+def checksum(data: bytes) -> int:
+    """
+    Функция вычисляет контрольную сумму icmp пакета
+    """
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def build_echo_request(
+    identifier: int, sequence: int, family: int = socket.AF_INET
+) -> bytes:
+    """
+    Функция формирует icmp пакет echo request. Контрольную сумму
+    icmpv6 пакета вычисляет ядро: она включает адреса ip заголовка.
+    """
+    payload = b'ndce' * 8
+    if family == socket.AF_INET6:
+        return struct.pack(
+            '!BBHHH', ICMPV6_ECHO_REQUEST, 0, 0, identifier, sequence
+        ) + payload
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    return struct.pack(
+        '!BBHHH',
+        ICMP_ECHO_REQUEST,
+        0,
+        checksum(header + payload),
+        identifier,
+        sequence
+    ) + payload
+
+
+class _Batch:
+    """
+    Состояние опроса одной группы узлов
+    """
+    def __init__(self, hosts: Iterable[str]):
+        self.pending = set(hosts)
+        self.alive = set()
+        self.done = asyncio.Event()
+        self.sequences = []
+        # Количество отправленных узлу запросов
+        self.attempts: Dict[str, int] = {}
+
+    def reply(self, host: str, rtt: float) -> None:
+        if host in self.pending:
+            self.pending.discard(host)
+            self.alive.add(host)
+            metrics.PHASE_IN_FLIGHT.dec(phase='icmp')
+            metrics.observe('icmp', rtt)
+            if not self.pending:
+                self.done.set()
+
+    def fail(self, host: str) -> None:
+        """
+        Функция исключает узел, запрос которому не удалось отправить
+        """
+        if host in self.pending:
+            self.pending.discard(host)
+            metrics.PHASE_IN_FLIGHT.dec(phase='icmp')
+            metrics.observe('icmp', None, 'error')
+            if not self.pending:
+                self.done.set()
+
+
+class IcmpSweeper:
+    """
+    Класс опрашивает группы узлов по протоколу icmp через общий сокет
+    для каждого семейства адресов: icmp для IPv4 и icmpv6 для IPv6.
+    Ответы сопоставляются с запросами по идентификатору и номеру пакета,
+    поэтому группа опрашивается примерно за время одного таймаута.
+    Если таймаут и количество попыток не заданы, они вычисляются
+    для каждого узла по оценке времени ответа и потерь в его подсети.
+    """
+    def __init__(
+        self,
+        timeout: Optional[int | float] = None,
+        retries: Optional[int] = None,
+        rtt: Optional[RttTable] = None
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.rtt = rtt or icmp_rtt
+        self.adaptive = config.RTT_ADAPTIVE
+        # Семейство адресов - сокет и признак сокета без привилегий:
+        # ядро само подставляет идентификатор и возвращает ответ
+        # без ip заголовка
+        self.sockets: Dict[int, Tuple[socket.socket, bool]] = {}
+        self.identifier = os.getpid() & 0xffff
+        self._sequence = itertools.count()
+        # Номер пакета - узел, группа, время отправки и номер попытки
+        self._waiters: Dict[int, Tuple[str, _Batch, float, int]] = {}
+        # Запросы, ответ на которые не дождались: опоздавший ответ
+        # не делает узел доступным, но уточняет оценку времени ответа
+        self._late: Dict[int, Tuple[str, float]] = {}
+
+    async def __aenter__(self) -> 'IcmpSweeper':
+        self.open()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """
+        Функция открывает общие icmp сокеты. Если IPv6 недоступен,
+        запросы узлам IPv6 завершаются ошибкой. Если не удалось открыть
+        сокет IPv4 (нет прав на raw сокет и группа процесса не входит
+        в net.ipv4.ping_group_range), вызывается исключение ConnectionError.
+        """
+        try:
+            self._open(socket.AF_INET, socket.IPPROTO_ICMP)
+        except OSError as err:
+            raise ConnectionError(f'Не удалось открыть icmp сокет: {err}') from err
+        try:
+            self._open(socket.AF_INET6, socket.IPPROTO_ICMPV6)
+        except OSError as err:
+            print('IPv6', err)
+
+    def _open(self, family: int, protocol: int) -> None:
+        unprivileged = False
+        try:
+            sock = socket.socket(family, socket.SOCK_RAW, protocol)
+        except PermissionError:
+            sock = socket.socket(family, socket.SOCK_DGRAM, protocol)
+            unprivileged = True
+        try:
+            # Ответы на целую группу запросов приходят почти одновременно,
+            # стандартного буфера приема для них недостаточно
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, config.PING_SOCKET_BUFFER
+            )
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        asyncio.get_running_loop().add_reader(
+            sock.fileno(), self._receive, sock, family, unprivileged
+        )
+        self.sockets[family] = (sock, unprivileged)
+
+    def close(self) -> None:
+        """
+        Функция закрывает общие icmp сокеты
+        """
+        for sock, _ in self.sockets.values():
+            asyncio.get_running_loop().remove_reader(sock.fileno())
+            sock.close()
+        self.sockets.clear()
+        self._waiters.clear()
+        self._late.clear()
+
+    def _next_sequence(self) -> int:
+        while True:
+            sequence = next(self._sequence) & 0xffff
+            if sequence not in self._waiters:
+                return sequence
+
+    def _receive(self, sock: socket.socket, family: int, unprivileged: bool) -> None:
+        reply = ICMPV6_ECHO_REPLY if family == socket.AF_INET6 else ICMP_ECHO_REPLY
+        while True:
+            try:
+                data, address = sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except Exception as err:
+                print(err)
+                return
+            if not unprivileged and family == socket.AF_INET:
+                # Пропускаем ip заголовок, icmpv6 сокет возвращает
+                # пакет без него
+                data = data[(data[0] & 0x0f) * 4:]
+            if len(data) < 8 or data[0] != reply:
+                continue
+            identifier, sequence = struct.unpack('!HH', data[4:8])
+            if not unprivileged and identifier != self.identifier:
+                continue
+            waiter = self._waiters.get(sequence)
+            if waiter and waiter[0] == address[0]:
+                host, batch, sent, attempt = waiter
+                if host in batch.pending:
+                    # Номер пакета указывает, на какую из попыток получен
+                    # ответ, поэтому время ответа известно и для повторов
+                    rtt = time.perf_counter() - sent
+                    self.rtt.update(host, rtt, attempt)
+                    batch.reply(host, rtt)
+                    # Ответ только на повторный запрос - признак потерь,
+                    # в том числе из-за ограничения частоты icmp на узлах
+                    if attempt == 1:
+                        get_controller().success()
+                    else:
+                        get_controller().congestion()
+                continue
+            late = self._late.pop(sequence, None)
+            if late and late[0] == address[0]:
+                rtt = time.perf_counter() - late[1]
+                if rtt < config.RTT_MAX_TIMEOUT:
+                    self.rtt.update(late[0], rtt)
+                    get_controller().congestion()
+
+    def attempts(self, host: str) -> int:
+        """
+        Функция возвращает количество попыток запроса узла
+        """
+        if self.retries is not None:
+            return max(1, self.retries)
+        if not self.adaptive:
+            return max(1, config.PING_RETRIES)
+        return self.rtt.attempts(host)
+
+    def wait_time(self, host: str, attempt: int) -> float:
+        """
+        Функция возвращает время ожидания ответа на попытку запроса узла
+        """
+        if self.timeout is not None:
+            return self.timeout
+        if not self.adaptive:
+            return config.PING_TIMEOUT
+        return self.rtt.wait(host, attempt, self.attempts(host))
+
+    async def _send(self, host: str, batch: _Batch, attempt: int) -> bool:
+        """
+        Функция отправляет запрос узлу. Узел, запрос которому
+        не удалось отправить, исключается из группы.
+        """
+        family = socket.AF_INET6 if ':' in host else socket.AF_INET
+        if family not in self.sockets:
+            print(host, 'IPv6 недоступен')
+            batch.fail(host)
+            return False
+        sock, _ = self.sockets[family]
+        await get_rate_limiter().take()
+        sequence = self._next_sequence()
+        self._waiters[sequence] = (host, batch, time.perf_counter(), attempt)
+        self._late.pop(sequence, None)
+        batch.sequences.append(sequence)
+        try:
+            await asyncio.get_running_loop().sock_sendto(
+                sock,
+                build_echo_request(self.identifier, sequence, family),
+                (host, 0)
+            )
+        except Exception as err:
+            print(host, err)
+            batch.fail(host)
+            return False
+        return True
+
+    async def sweep(self, hosts: Iterable[str]) -> Set[str]:
+        """
+        Функция возвращает множество доступных узлов из заданной группы
+        """
+        batch = _Batch(hosts)
+        metrics.PHASE_IN_FLIGHT.inc(len(batch.pending), phase='icmp')
+        try:
+            while batch.pending:
+                # Повторно запросы отправляются только молчащим узлам,
+                # пока для узла не исчерпано количество попыток.
+                # Группа ожидает ответа столько, сколько нужно самому
+                # медленному из опрашиваемых узлов
+                wait = 0.0
+                for host in list(batch.pending):
+                    attempt = batch.attempts.get(host, 0) + 1
+                    if attempt > self.attempts(host):
+                        continue
+                    batch.attempts[host] = attempt
+                    if await self._send(host, batch, attempt):
+                        wait = max(wait, self.wait_time(host, attempt))
+                if not wait:
+                    break
+                try:
+                    await asyncio.wait_for(batch.done.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for sequence in batch.sequences:
+                host, _, sent, _ = self._waiters.pop(sequence)
+                if host in batch.pending:
+                    self._late[sequence] = (host, sent)
+            # Длительность ожидания молчащих узлов определяется таймаутом
+            # и в гистограмму не попадает
+            metrics.PHASE_IN_FLIGHT.dec(len(batch.pending), phase='icmp')
+            metrics.PHASE_RESULTS.inc(
+                len(batch.pending), phase='icmp', outcome='timeout'
+            )
+            batch.pending.clear()
+        return batch.alive
+
+    async def ping(self, host: str) -> bool:
+        """
+        Функция проверяет доступность одного узла
+        """
+        return host in await self.sweep([host])
+
+
+async def _batches(
+    hosts: Iterable[str] | AsyncIterable[str], batch_size: int
+) -> AsyncIterator[List[str]]:
+    if hasattr(hosts, '__aiter__'):
+        batch = []
+        async for host in hosts:
+            batch.append(host)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+    hosts = iter(hosts)
+    while True:
+        batch = list(itertools.islice(hosts, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+async def sweep_hosts(
+    hosts: Iterable[str] | AsyncIterable[str],
+    batch_size: Optional[int] = config.PING_BATCH_SIZE,
+    timeout: Optional[int | float] = None,
+    retries: Optional[int] = None,
+    unreachable: Optional[Callable[[str], None]] = None
+) -> AsyncIterator[str]:
+    """
+    Функция опрашивает узлы группами через один icmp сокет
+    и возвращает доступные узлы по мере завершения опроса каждой группы.
+    Для не ответивших узлов вызывается функция unreachable.
+    """
+    async with IcmpSweeper(timeout, retries) as sweeper:
+        async for batch in _batches(hosts, batch_size):
+            alive = await sweeper.sweep(batch)
+            for host in batch:
+                if host in alive:
+                    yield host
+                elif unreachable:
+                    unreachable(host)
+
+
 async def ping_host(
     host: str,
-    timeout: Optional[int|float] = config.PING_TIMEOUT,
-    count: Optional[int] = config.PING_RETRIES
+    timeout: Optional[int|float] = None,
+    count: Optional[int] = None
 ) -> Tuple[str, bool]:
     """
     Функция проверяет доступность заданного узла по протоколу icmp
     """
-    for i in range(count):
-        try:
-            await aioping.ping(host, timeout=timeout)
-            return host, True
-        except Exception as err:
-            print(host, err)
-            if i == count - 1:
-                return host, False
-            else:
-                await asyncio.sleep(0.1)
+    try:
+        async with IcmpSweeper(timeout, count) as sweeper:
+            return host, await sweeper.ping(host)
+    except Exception as err:
+        print(host, err)
+        return host, False
@@ -0,0 +1,413 @@
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+import asyncio
+import bisect
+import time
+
+
+# Границы интервалов гистограмм длительности, секунд
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = '') -> str:
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Базовый класс метрики с набором меток
+    """
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[Any, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[Any, ...]:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def values(self) -> Dict[Tuple[Any, ...], Any]:
+        """
+        Функция возвращает значения метрики по наборам меток
+        """
+        return self._values
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for key, value in self.values().items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f'{name}{labels} {_format_value(value)}')
+        return lines
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def _copy(self, value: Any) -> Any:
+        return value
+
+    def _subtract(self, value: Any, previous: Any) -> Any:
+        return value - (previous or 0)
+
+    def _add(self, key: Tuple[Any, ...], delta: Any) -> None:
+        self._values[key] = self._values.get(key, 0) + delta
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """
+    Значения метрики, полученные от других процессов, не складываются
+    с собственными: хранится последнее значение каждого процесса,
+    а отображается сумма. Значения завершившегося процесса удаляются.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Процесс - последние значения его метрики
+        self._sources: Dict[Hashable, Dict[Tuple[Any, ...], Any]] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: Any) -> float:
+        key = self._key(labels)
+        return self._values.get(key, 0) + sum(
+            values.get(key, 0) for values in self._sources.values()
+        )
+
+    def values(self) -> Dict[Tuple[Any, ...], Any]:
+        if not self._sources:
+            return self._values
+        combined = dict(self._values)
+        for values in self._sources.values():
+            for key, value in values.items():
+                combined[key] = combined.get(key, 0) + value
+        return combined
+
+    def clear(self) -> None:
+        super().clear()
+        self._sources.clear()
+
+
+class Histogram(Metric):
+    """
+    Гистограмма хранит для каждого набора меток количество наблюдений
+    в каждом интервале, их сумму и общее количество
+    """
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # Количество в интервалах, сумма, общее количество
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def quantile(self, share: float, **labels: Any) -> float:
+        """
+        Функция оценивает квантиль по интервалам гистограммы
+        линейной интерполяцией внутри интервала
+        """
+        state = self._values.get(self._key(labels))
+        if not state or not state[2]:
+            return 0.0
+        rank = share * state[2]
+        seen = 0
+        lower = 0.0
+        for index, count in enumerate(state[0]):
+            if index == len(self.buckets):
+                return self.buckets[-1]
+            upper = self.buckets[index]
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+
+    def _copy(self, value: Any) -> Any:
+        return [list(value[0]), value[1], value[2]]
+
+    def _subtract(self, value: Any, previous: Any) -> Any:
+        if previous is None:
+            return self._copy(value)
+        return [
+            [a - b for a, b in zip(value[0], previous[0])],
+            value[1] - previous[1],
+            value[2] - previous[2],
+        ]
+
+    def _add(self, key: Tuple[Any, ...], delta: Any) -> None:
+        state = self._values.get(key)
+        if state is None:
+            self._values[key] = self._copy(delta)
+            return
+        state[0] = [a + b for a, b in zip(state[0], delta[0])]
+        state[1] += delta[1]
+        state[2] += delta[2]
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                labels = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(bound)}"'
+                )
+                yield f'{self.name}_bucket', labels, cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class Registry:
+    """
+    Набор метрик процесса
+    """
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        # Значения, переданные при предыдущем вызове changes
+        self._previous: Dict[str, Dict[Tuple[Any, ...], Any]] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Функция возвращает метрики в текстовом формате Prometheus
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self) -> None:
+        for metric in self._metrics:
+            metric.clear()
+
+    def changes(self) -> Dict[str, Dict[Tuple[Any, ...], Any]]:
+        """
+        Функция возвращает изменения значений метрик с предыдущего вызова:
+        приращения счетчиков и гистограмм и новые значения показателей.
+        Метрики нескольких процессов собираются в одном процессе вызовом merge.
+        """
+        changes = {}
+        for metric in self._metrics:
+            previous = self._previous.setdefault(metric.name, {})
+            delta = {}
+            for key, value in metric._values.items():
+                if value != previous.get(key):
+                    if isinstance(metric, Gauge):
+                        delta[key] = value
+                    else:
+                        delta[key] = metric._subtract(value, previous.get(key))
+                    previous[key] = metric._copy(value)
+            if delta:
+                changes[metric.name] = delta
+        return changes
+
+    def merge(
+        self,
+        changes: Dict[str, Dict[Tuple[Any, ...], Any]],
+        source: Hashable
+    ) -> None:
+        """
+        Функция добавляет изменения метрик другого процесса source
+        """
+        metrics = {metric.name: metric for metric in self._metrics}
+        for name, delta in changes.items():
+            metric = metrics.get(name)
+            if metric is None:
+                continue
+            if isinstance(metric, Gauge):
+                metric._sources.setdefault(source, {}).update(delta)
+                continue
+            for key, value in delta.items():
+                metric._add(key, value)
+
+    def forget(self, source: Hashable) -> None:
+        """
+        Функция удаляет значения показателей завершившегося процесса source.
+        Накопленные счетчики и гистограммы сохраняются.
+        """
+        for metric in self._metrics:
+            if isinstance(metric, Gauge):
+                metric._sources.pop(source, None)
+
+
+REGISTRY = Registry()
+
+PHASE_DURATION = REGISTRY.register(Histogram(
+    'ndce_phase_duration_seconds',
+    'Длительность операций по фазам опроса и передачи команд',
+    ('phase',)
+))
+PHASE_RESULTS = REGISTRY.register(Counter(
+    'ndce_phase_total',
+    'Количество операций по фазам и результатам',
+    ('phase', 'outcome')
+))
+PHASE_IN_FLIGHT = REGISTRY.register(Gauge(
+    'ndce_phase_in_flight',
+    'Количество выполняющихся операций по фазам',
+    ('phase',)
+))
+WORKERS_BUSY = REGISTRY.register(Gauge(
+    'ndce_workers_busy',
+    'Количество занятых обработчиков пула',
+    ('pool',)
+))
+WORKERS = REGISTRY.register(Gauge(
+    'ndce_workers',
+    'Количество обработчиков пула',
+    ('pool',)
+))
+CONCURRENCY_LIMIT = REGISTRY.register(Gauge(
+    'ndce_concurrency_limit',
+    'Текущее ограничение количества одновременно опрашиваемых устройств'
+))
+CONGESTION_SIGNALS = REGISTRY.register(Counter(
+    'ndce_congestion_signals_total',
+    'Количество потерянных и опоздавших ответов при опросе'
+))
+
+PHASES = (
+    'icmp', 'snmp', 'tcp',
+    'telnet_connect', 'telnet_login', 'telnet_command',
+    'ssh_connect', 'ssh_login', 'ssh_command',
+)
+# Результат closed - отказ в соединении при проверке tcp порта
+OUTCOMES = ('success', 'timeout', 'error', 'closed')
+
+
+class measure:
+    """
+    Контекстный менеджер замеряет длительность операции фазы
+    и учитывает ее результат: timeout при истечении времени ожидания,
+    error при другом исключении, иначе значение outcome,
+    которое операция может изменить
+    """
+    def __init__(self, phase: str):
+        self.phase = phase
+        self.outcome = 'success'
+        self.started = 0.0
+
+    def __enter__(self) -> 'measure':
+        self.started = time.perf_counter()
+        PHASE_IN_FLIGHT.inc(phase=self.phase)
+        return self
+
+    def __exit__(self, kind: Optional[type], *_: Any) -> bool:
+        PHASE_IN_FLIGHT.dec(phase=self.phase)
+        if kind is not None:
+            if issubclass(kind, (asyncio.TimeoutError, TimeoutError)):
+                self.outcome = 'timeout'
+            elif issubclass(kind, asyncio.CancelledError):
+                self.outcome = 'cancelled'
+            else:
+                self.outcome = 'error'
+        observe(self.phase, time.perf_counter() - self.started, self.outcome)
+        return False
+
+
+def observe(phase: str, duration: Optional[float], outcome: str = 'success') -> None:
+    """
+    Функция учитывает завершенную операцию фазы. Длительность
+    операций, не дождавшихся ответа, может не учитываться.
+    """
+    if duration is not None:
+        PHASE_DURATION.observe(duration, phase=phase)
+    PHASE_RESULTS.inc(phase=phase, outcome=outcome)
+
+
+def pools() -> List[Tuple[str, int, int]]:
+    """
+    Функция возвращает имя, количество занятых и общее количество
+    обработчиков запущенных пулов
+    """
+    return [
+        (name, int(WORKERS_BUSY.get(pool=name)), int(size))
+        for (name,), size in WORKERS.values().items()
+        if size
+    ]
+
+
+def summary() -> List[Dict[str, Any]]:
+    """
+    Функция возвращает сводку по фазам для отображения
+    """
+    rows = []
+    for phase in PHASES:
+        outcomes = {
+            outcome: int(PHASE_RESULTS.get(phase=phase, outcome=outcome))
+            for outcome in OUTCOMES
+        }
+        total = sum(
+            value for (name, _), value in PHASE_RESULTS._values.items()
+            if name == phase
+        )
+        rows.append({
+            'phase': phase,
+            'total': int(total),
+            **outcomes,
+            'other': int(total) - sum(outcomes.values()),
+            'in_flight': int(PHASE_IN_FLIGHT.get(phase=phase)),
+            'p50_ms': round(PHASE_DURATION.quantile(0.5, phase=phase) * 1000, 1),
+            'p99_ms': round(PHASE_DURATION.quantile(0.99, phase=phase) * 1000, 1),
+        })
+    return rows
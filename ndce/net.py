@@ -1,6 +1,8 @@
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, Optional
+import asyncio
 import ipaddress
-import socket
+from ndce import metrics
+from ndce.control import get_rate_limiter
 import config
 
 
@@ -28,45 +30,97 @@ def is_ip_subnet(subnet: str) -> bool:
         return False
 
 
-def get_hosts_from_subnet(subnet: str) -> List[str]:
+def get_hosts_from_subnet(subnet: str) -> Iterator[str]:
     """
-    Функция возвращает список хостовых адресов заданной подсети
+    Функция последовательно возвращает хостовые адреса заданной подсети.
+    Адреса генерируются по мере запроса, а не хранятся списком,
+    поэтому размер подсети не влияет на расход памяти.
     """
     try:
-        return [str(host) for host in ipaddress.ip_network(subnet).hosts()]
+        network = ipaddress.ip_network(subnet)
     except Exception as err:
         print(err)
-    # Подсеть должна быть задана и в правильно формате.
-    # Иначе необходимо вернуть пустой список.
-    return []
+        # Подсеть должна быть задана и в правильно формате.
+        # Иначе адреса не возвращаются.
+        return
+    for host in network.hosts():
+        yield str(host)
 
 
-def tcp_port_is_open(
+_connections: Optional[asyncio.Semaphore] = None
+_connections_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_connection_limiter() -> asyncio.Semaphore:
+    """
+    Функция возвращает общее для цикла событий ограничение количества
+    одновременно открываемых при проверке портов соединений
+    """
+    global _connections, _connections_loop
+    loop = asyncio.get_running_loop()
+    if _connections is None or _connections_loop is not loop:
+        _connections = asyncio.Semaphore(max(1, config.PROBE_CONNECTIONS))
+        _connections_loop = loop
+    return _connections
+
+
+async def tcp_port_is_open(
     ip: str, port: int, timeout: Optional[float | int] = config.SOCKET_TIMEOUT
 ) -> bool:
     """
     Функция проверяет открытость порта на узле по заданному протоколу
     """
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        sock.settimeout(timeout)
+    async with get_connection_limiter():
+        await get_rate_limiter().take()
+        with metrics.measure('tcp') as phase:
+            try:
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(ip, port), timeout
+                )
+            except asyncio.TimeoutError:
+                phase.outcome = 'timeout'
+                return False
+            except ConnectionRefusedError:
+                # Отказ в соединении - закрытый порт, а не ошибка проверки
+                phase.outcome = 'closed'
+                return False
+            except Exception as err:
+                # Нехватка дескрипторов, недоступная сеть и другие ошибки
+                print(ip, err)
+                phase.outcome = 'error'
+                return False
+        writer.close()
         try:
-            return sock.connect_ex((ip, port)) == 0
-        except Exception as err:
-            print(err)
-            return False
-        finally:
-            sock.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
+    return True
+
+
+async def probe_tcp_ports(
+    ip: str,
+    ports: Optional[Iterable[int]] = config.PROBE_PORTS,
+    timeout: Optional[float | int] = config.SOCKET_TIMEOUT
+) -> Dict[int, bool]:
+    """
+    Функция одновременно проверяет открытость заданных портов на узле
+    """
+    ports = list(ports)
+    results = await asyncio.gather(
+        *(tcp_port_is_open(ip, port, timeout) for port in ports)
+    )
+    return dict(zip(ports, results))
 
 
-def telnet_is_enabled(ip: str) -> bool:
+async def telnet_is_enabled(ip: str) -> bool:
     """
     Функция проверяет доступность узла по протоколу telnet
     """
-    return tcp_port_is_open(ip, 23)
+    return await tcp_port_is_open(ip, 23)
 
 
-def ssh_is_enabled(ip: str) -> bool:
+async def ssh_is_enabled(ip: str) -> bool:
     """
     Функция проверяет доступность узла по протоколу ssh
     """
-    return tcp_port_is_open(ip, 22)
+    return await tcp_port_is_open(ip, 22)
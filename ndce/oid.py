@@ -0,0 +1,208 @@
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import pickle
+import config
+
+
+# Префикс идентификаторов, выделенных производителям (enterprises)
+ENTERPRISES = (1, 3, 6, 1, 4, 1)
+
+# Версия формата индекса, при изменении индекс пересобирается
+INDEX_VERSION = 2
+
+# Ключ узла дерева, под которым хранится номер записи
+_RECORD = None
+
+
+def parse_oid(oid: str) -> Tuple[int, ...]:
+    """
+    Функция преобразует строку вида '.1.3.6.1' в кортеж чисел
+    """
+    return tuple(int(arc) for arc in oid.strip().strip('.').split('.') if arc)
+
+
+def _common(records: List[Dict[str, str]]) -> Dict[str, str]:
+    """
+    Функция возвращает производителя и категорию, общие для всех записей
+    """
+    common = {}
+    for key in ('vendor', 'category'):
+        values = {record.get(key) for record in records}
+        if len(values) == 1 and None not in values:
+            common[key] = values.pop()
+    return common
+
+
+def source_digest(data: bytes) -> str:
+    """
+    Функция возвращает хэш содержимого базы идентификаторов.
+    Индекс сравнивается с базой по хэшу, а не по времени изменения
+    файлов, которое после git checkout зависит от порядка записи.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def build_index(ids: Dict[str, Dict[str, str]]) -> Tuple[List[Dict[str, str]], Dict]:
+    """
+    Функция строит префиксное дерево идентификаторов.
+    Кроме идентификаторов моделей, в дерево добавляются записи
+    уровня производителя: производитель и категория, общие для всех
+    известных моделей производителя, используются для неизвестных моделей.
+    """
+    entries = dict(ids)
+    for objectid, category in zip(config.MKT_SYS_OBJECT_IDS, ('Router', 'Switch')):
+        # Модель устройств MikroTik определяется по описанию
+        entries.setdefault(objectid, {'vendor': 'MikroTik', 'category': category})
+
+    enterprises: Dict[Tuple[int, ...], List[Dict[str, str]]] = {}
+    for objectid, record in entries.items():
+        arcs = parse_oid(objectid)
+        if arcs[:len(ENTERPRISES)] == ENTERPRISES and len(arcs) > len(ENTERPRISES) + 1:
+            enterprises.setdefault(arcs[:len(ENTERPRISES) + 1], []).append(record)
+
+    records: List[Dict[str, str]] = []
+    trie: Dict = {}
+
+    def insert(arcs: Tuple[int, ...], record: Dict[str, str]) -> None:
+        node = trie
+        for arc in arcs:
+            node = node.setdefault(arc, {})
+        node[_RECORD] = len(records)
+        records.append(record)
+
+    for arcs, members in enterprises.items():
+        common = _common(members)
+        if common:
+            insert(arcs, common)
+    for objectid, record in entries.items():
+        insert(parse_oid(objectid), {
+            key: value for key, value in record.items()
+            if key in ('vendor', 'model', 'category')
+        })
+    return records, trie
+
+
+def compile_index(
+    source: Optional[str] = config.SYS_OBJECT_IDS_DB,
+    target: Optional[str] = config.SYS_OBJECT_IDS_INDEX
+) -> int:
+    """
+    Функция собирает индекс из базы идентификаторов и сохраняет его
+    в файл вместе с версией формата и хэшем базы.
+    Возвращает количество записей индекса.
+    """
+    with open(source, 'rb') as file:
+        data = file.read()
+    records, trie = build_index(json.loads(data))
+    with open(target, 'wb') as file:
+        pickle.dump(
+            (INDEX_VERSION, source_digest(data), records, trie),
+            file,
+            protocol=pickle.HIGHEST_PROTOCOL
+        )
+    return len(records)
+
+
+class OidClassifier:
+    """
+    Класс определяет производителя, модель и категорию устройства
+    по system object id. Используется наиболее длинный известный префикс
+    идентификатора. Индекс загружается при первом обращении: из
+    собранного файла, а если он отсутствует или собран из другой
+    версии базы - из базы идентификаторов.
+    """
+    def __init__(
+        self,
+        source: Optional[str] = config.SYS_OBJECT_IDS_DB,
+        index: Optional[str] = config.SYS_OBJECT_IDS_INDEX
+    ):
+        self.source = source
+        self.index = index
+        self._records: Optional[List[Dict[str, str]]] = None
+        self._trie: Dict = {}
+
+    def load(self) -> None:
+        """
+        Функция загружает индекс
+        """
+        try:
+            with open(self.source, 'rb') as file:
+                data = file.read()
+        except OSError as err:
+            print(err)
+            data = None
+        try:
+            with open(self.index, 'rb') as file:
+                version, digest, records, trie = pickle.load(file)
+            # Без базы используется собранный индекс
+            if version == INDEX_VERSION and (
+                data is None or digest == source_digest(data)
+            ):
+                self._records, self._trie = records, trie
+                return
+        except FileNotFoundError:
+            pass
+        except Exception as err:
+            print(err)
+        try:
+            self._records, self._trie = build_index(json.loads(data))
+        except Exception as err:
+            print(err)
+            self._records, self._trie = build_index({})
+
+    @property
+    def loaded(self) -> bool:
+        return self._records is not None
+
+    def __len__(self) -> int:
+        if not self.loaded:
+            self.load()
+        return len(self._records)
+
+    def lookup(self, objectid: str) -> Dict[str, str]:
+        """
+        Функция возвращает производителя, модель и категорию
+        по наиболее длинному известному префиксу идентификатора.
+        Для неизвестного идентификатора возвращается пустой словарь.
+        """
+        if not self.loaded:
+            self.load()
+        try:
+            arcs = parse_oid(objectid)
+        except ValueError:
+            return {}
+        node = self._trie
+        found = None
+        for arc in arcs:
+            node = node.get(arc)
+            if node is None:
+                break
+            found = node.get(_RECORD, found)
+        return dict(self._records[found]) if found is not None else {}
+
+
+_classifier: Optional[OidClassifier] = None
+
+
+def get_classifier() -> OidClassifier:
+    """
+    Функция возвращает общий для процесса классификатор
+    """
+    global _classifier
+    if _classifier is None:
+        _classifier = OidClassifier()
+    return _classifier
+
+
+def classify(objectid: str) -> Dict[str, str]:
+    """
+    Функция возвращает производителя, модель и категорию устройства
+    по system object id
+    """
+    return get_classifier().lookup(objectid)
+
+
+if __name__ == '__main__':
+    count = compile_index()
+    print(f'{config.SYS_OBJECT_IDS_INDEX}: {count}')
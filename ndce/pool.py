@@ -0,0 +1,74 @@
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, Optional
+import asyncio
+from ndce import metrics
+from ndce.control import AimdController
+import config
+
+
+# Маркер завершения очереди заданий для обработчиков
+_STOP = object()
+
+
+async def run_workers(
+    items: Iterable[Any] | AsyncIterable[Any],
+    handler: Callable[[Any], Awaitable[None]],
+    workers: Optional[int] = config.MAX_CONCURRENT,
+    name: Optional[str] = 'workers',
+    limiter: Optional[AimdController] = None
+) -> None:
+    """
+    Функция обрабатывает элементы заданной последовательности пулом
+    из фиксированного количества обработчиков.
+    Элементы извлекаются из последовательности по мере освобождения
+    обработчиков, поэтому объем занимаемой памяти не зависит
+    от длины последовательности.
+    Количество занятых обработчиков учитывается в метриках под именем пула.
+    Если задан регулятор, одновременно работают не более разрешенного
+    им количества обработчиков, а workers - верхняя граница.
+    """
+    workers = max(1, workers)
+    # Очередь ограничена, чтобы генератор не опережал обработчиков
+    queue = asyncio.Queue(maxsize=workers)
+
+    async def produce() -> None:
+        try:
+            if hasattr(items, '__aiter__'):
+                async for item in items:
+                    await queue.put(item)
+            else:
+                for item in items:
+                    await queue.put(item)
+        finally:
+            for _ in range(workers):
+                await queue.put(_STOP)
+
+    async def consume() -> None:
+        while True:
+            item = await queue.get()
+            if item is _STOP:
+                return
+            # Место у регулятора занимается только с заданием на руках,
+            # чтобы простаивающие обработчики не считались опрашивающими
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                metrics.WORKERS_BUSY.inc(pool=name)
+                try:
+                    await handler(item)
+                except Exception as err:
+                    print(item, err)
+                finally:
+                    metrics.WORKERS_BUSY.dec(pool=name)
+            finally:
+                if limiter is not None:
+                    limiter.release()
+
+    metrics.WORKERS.inc(workers, pool=name)
+    tasks = [asyncio.create_task(produce())]
+    tasks.extend(asyncio.create_task(consume()) for _ in range(workers))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        metrics.WORKERS.dec(workers, pool=name)
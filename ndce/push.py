@@ -0,0 +1,192 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass, field
+import asyncio
+from ndce.pool import run_workers
+from ndce.client import Client, DeviceUnreachable
+from ndce.telnet import Telnet
+from ndce.ssh import Ssh
+from ndce.sessions import SessionPool
+import config
+
+
+@dataclass
+class PushResult:
+    """
+    Результат передачи команд одному устройству
+    """
+    host: str
+    success: bool = False
+    # Признак того, что соединение с устройством было установлено
+    reachable: bool = True
+    duration: float = 0.0
+    output: List[Tuple[str, str]] = field(default_factory=list)
+    error: str = ''
+
+
+@dataclass
+class PushProgress:
+    """
+    Ход передачи команд группе устройств
+    """
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    # Недоступные устройства, учтенные среди failed
+    unreachable: int = 0
+    # Номер текущей волны при поэтапной передаче
+    wave: int = 0
+    # Признак остановки поэтапной передачи из-за ошибок
+    stopped: bool = False
+
+    @property
+    def done(self) -> int:
+        return self.completed + self.failed
+
+    @property
+    def failure_rate(self) -> float:
+        # Доля ошибок среди доступных устройств: недоступность устройства
+        # не говорит о том, что передаваемые команды ошибочны
+        reached = self.done - self.unreachable
+        return (self.failed - self.unreachable) / reached if reached else 0.0
+
+
+TRANSPORTS = {
+    'telnet': Telnet,
+    'ssh': Ssh,
+}
+
+
+def create_client(device: Dict[str, Any], commands: List[str]) -> Client:
+    """
+    Функция выбирает транспорт по протоколам, поддерживаемым устройством,
+    в порядке TRANSPORT_PRIORITY. Если поддержка протоколов неизвестна,
+    используется telnet.
+    """
+    transport = Telnet
+    for name in config.TRANSPORT_PRIORITY:
+        if device.get(name):
+            transport = TRANSPORTS[name]
+            break
+    return transport(
+        ip=device['host'],
+        commands=commands,
+        sysobjectid=device.get('sysobjectid')
+    )
+
+
+async def push_device(
+    device: Dict[str, Any],
+    commands: List[str],
+    timeout: Optional[int | float] = config.PUSH_TIMEOUT,
+    pool: Optional[SessionPool] = None,
+    parallel: Optional[bool] = False
+) -> PushResult:
+    """
+    Функция передает команды одному устройству и возвращает результат.
+    Независимые команды (parallel) по ssh выполняются одновременно
+    в отдельных каналах одного соединения.
+    """
+    loop = asyncio.get_running_loop()
+    result = PushResult(host=device['host'])
+    started = loop.time()
+    client = create_client(device, commands)
+    try:
+        if parallel:
+            commands_done = client.exec_commands(pool)
+        else:
+            commands_done = client.cli_connect(pool)
+        result.output = await asyncio.wait_for(commands_done, timeout)
+        result.success = True
+    except DeviceUnreachable as err:
+        result.reachable = False
+        result.error = str(err)
+    except asyncio.TimeoutError as err:
+        result.output = client.outputs
+        # Таймауты соединения, входа и команд сообщают, что именно
+        # не дождались, общий таймаут передачи сообщения не содержит
+        result.error = str(err) or f'Превышено время передачи команд {timeout} с'
+    except Exception as err:
+        result.output = client.outputs
+        result.error = str(err) or type(err).__name__
+    result.duration = loop.time() - started
+    return result
+
+
+async def push_commands(
+    devices: Iterable[Dict[str, Any]],
+    commands: List[str],
+    workers: Optional[int] = config.PUSH_WORKERS,
+    timeout: Optional[int | float] = config.PUSH_TIMEOUT,
+    on_result: Optional[Callable[[PushResult, PushProgress], None]] = None,
+    progress: Optional[PushProgress] = None,
+    pool: Optional[SessionPool] = None,
+    parallel: Optional[bool] = False
+) -> List[PushResult]:
+    """
+    Функция передает команды устройствам не более чем через workers
+    одновременных сессий и возвращает результаты по каждому устройству.
+    После каждого устройства вызывается функция on_result.
+    """
+    devices = list(devices)
+    results = []
+    if progress is None:
+        progress = PushProgress(total=len(devices))
+
+    async def handle(device: Dict[str, Any]) -> None:
+        result = await push_device(device, commands, timeout, pool, parallel)
+        results.append(result)
+        if result.success:
+            progress.completed += 1
+        else:
+            progress.failed += 1
+            if not result.reachable:
+                progress.unreachable += 1
+        if on_result:
+            on_result(result, progress)
+
+    await run_workers(devices, handle, workers, 'push')
+    return results
+
+
+async def rollout_commands(
+    devices: Iterable[Dict[str, Any]],
+    commands: List[str],
+    canary: Optional[int] = config.ROLLOUT_CANARY,
+    growth: Optional[int | float] = config.ROLLOUT_GROWTH,
+    max_failure_rate: Optional[float] = config.ROLLOUT_MAX_FAILURE_RATE,
+    workers: Optional[int] = config.PUSH_WORKERS,
+    timeout: Optional[int | float] = config.PUSH_TIMEOUT,
+    on_result: Optional[Callable[[PushResult, PushProgress], None]] = None,
+    progress: Optional[PushProgress] = None,
+    pool: Optional[SessionPool] = None,
+    parallel: Optional[bool] = False
+) -> List[PushResult]:
+    """
+    Функция передает команды поэтапно: сначала контрольной группе
+    из canary устройств, затем волнами, каждая из которых в growth раз
+    больше предыдущей. Передача останавливается, если доля ошибок
+    превысила max_failure_rate, оставшиеся устройства не затрагиваются.
+    Доля ошибок считается только среди доступных устройств: устройства,
+    с которыми не удалось установить соединение, передачу не останавливают.
+    """
+    devices = list(devices)
+    results = []
+    if progress is None:
+        progress = PushProgress(total=len(devices))
+    size = max(1, canary)
+    start = 0
+    while start < len(devices):
+        progress.wave += 1
+        wave = devices[start:start + size]
+        results.extend(
+            await push_commands(
+                wave, commands, workers, timeout, on_result, progress, pool,
+                parallel
+            )
+        )
+        start += len(wave)
+        if progress.failure_rate > max_failure_rate:
+            progress.stopped = start < len(devices)
+            break
+        size = max(size + 1, int(size * growth))
+    return results
@@ -0,0 +1,169 @@
+from typing import Dict, Hashable, Optional
+import ipaddress
+import math
+import socket
+import config
+
+
+class RttEstimator:
+    """
+    Класс оценивает время ответа узлов так же, как nmap и tcp:
+    сглаженное время srtt и его отклонение rttvar обновляются
+    по каждому измерению, таймаут равен srtt + 4 * rttvar.
+    Доля потерь оценивается по ответам, полученным на повторные запросы.
+    """
+    def __init__(self):
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.samples = 0
+        self.lost = 0.0
+        self.delivered = 0.0
+
+    def update(self, rtt: Optional[float], attempt: int = 1) -> None:
+        """
+        Функция учитывает ответ, полученный на запрос с номером attempt.
+        Время ответа может быть неизвестно, если неясно, на какой
+        из повторных запросов пришел ответ.
+        """
+        if rtt is not None:
+            if self.srtt is None:
+                self.srtt = rtt
+                self.rttvar = rtt / 2
+            else:
+                delta = rtt - self.srtt
+                self.srtt += delta / 8
+                self.rttvar += (abs(delta) - self.rttvar) / 4
+            self.samples += 1
+        # Предыдущие запросы узлу, ответившему на повторный, потеряны
+        self.lost += attempt - 1
+        self.delivered += 1
+        # Старые наблюдения постепенно теряют вес
+        if self.lost + self.delivered > config.RTT_LOSS_WINDOW:
+            self.lost /= 2
+            self.delivered /= 2
+
+    @property
+    def timeout(self) -> Optional[float]:
+        if self.srtt is None:
+            return None
+        return self.srtt + 4 * self.rttvar
+
+    @property
+    def loss(self) -> Optional[float]:
+        if self.delivered < config.RTT_MIN_SAMPLES:
+            return None
+        return self.lost / (self.lost + self.delivered)
+
+
+class RttTable:
+    """
+    Класс хранит оценки времени ответа по подсетям и общую оценку
+    и вычисляет по ним таймаут и количество попыток запроса узла.
+    Для подсети без измерений используется общая оценка, до первого
+    ответа - заданные в конфигурации таймаут и количество попыток.
+    """
+    def __init__(
+        self,
+        timeout: int | float,
+        attempts: int,
+        prefix: Optional[int] = config.RTT_PREFIX,
+        prefix6: Optional[int] = config.RTT_PREFIX6
+    ):
+        self.initial_timeout = timeout
+        self.initial_attempts = max(1, attempts)
+        self.prefix = prefix
+        self.prefix6 = prefix6
+        self.overall = RttEstimator()
+        self.subnets: Dict[Hashable, RttEstimator] = {}
+
+    def subnet(self, host: str) -> Hashable:
+        """
+        Функция возвращает ключ подсети узла
+        """
+        try:
+            return int.from_bytes(socket.inet_aton(host), 'big') >> (32 - self.prefix)
+        except OSError:
+            return ipaddress.ip_network(f'{host}/{self.prefix6}', strict=False)
+
+    def explored(self, host: str) -> bool:
+        """
+        Функция проверяет, были ли ответы из подсети узла
+        """
+        estimator = self.subnets.get(self.subnet(host))
+        return estimator is not None and estimator.delivered > 0
+
+    def estimator(self, host: str) -> Optional[RttEstimator]:
+        """
+        Функция возвращает оценку для узла: подсети, если в ней уже
+        были ответы, иначе общую
+        """
+        estimator = self.subnets.get(self.subnet(host))
+        if estimator is not None and estimator.samples:
+            return estimator
+        return self.overall if self.overall.samples else None
+
+    def timeout(self, host: str) -> float:
+        """
+        Функция возвращает таймаут первого запроса узлу, секунд
+        """
+        estimator = self.estimator(host)
+        if estimator is None:
+            return self.initial_timeout
+        return min(
+            config.RTT_MAX_TIMEOUT, max(config.RTT_MIN_TIMEOUT, estimator.timeout)
+        )
+
+    def attempts(self, host: str) -> int:
+        """
+        Функция возвращает количество попыток запроса, при котором
+        вероятность не получить ответ доступного узла из-за потерь
+        не превышает RTT_TARGET_MISS
+        """
+        estimator = self.subnets.get(self.subnet(host))
+        loss = estimator.loss if estimator is not None else None
+        if loss is None:
+            loss = self.overall.loss
+        if loss is None:
+            return self.initial_attempts
+        if loss <= 0:
+            return config.RTT_MIN_ATTEMPTS
+        if loss >= 1:
+            return config.RTT_MAX_ATTEMPTS
+        attempts = math.ceil(math.log(config.RTT_TARGET_MISS) / math.log(loss))
+        return min(config.RTT_MAX_ATTEMPTS, max(config.RTT_MIN_ATTEMPTS, attempts))
+
+    def wait(self, host: str, attempt: int, attempts: int) -> float:
+        """
+        Функция возвращает время ожидания ответа на попытку запроса узла.
+        Узел подсети, из которой еще не было ответов, перед последней
+        попыткой ожидается не меньше RTT_EXPLORE_TIMEOUT: общая оценка
+        может относиться к более быстрым подсетям.
+        """
+        wait = backoff(self.timeout(host), attempt)
+        if attempt >= attempts and not self.explored(host):
+            wait = max(wait, config.RTT_EXPLORE_TIMEOUT)
+        return wait
+
+    def update(self, host: str, rtt: Optional[float], attempt: int = 1) -> None:
+        """
+        Функция учитывает ответ узла в оценке его подсети и общей оценке
+        """
+        key = self.subnet(host)
+        estimator = self.subnets.get(key)
+        if estimator is None:
+            estimator = self.subnets[key] = RttEstimator()
+        estimator.update(rtt, attempt)
+        self.overall.update(rtt, attempt)
+
+
+def backoff(timeout: float, attempt: int) -> float:
+    """
+    Функция возвращает таймаут повторного запроса с номером attempt:
+    каждый следующий запрос ожидает ответа вдвое дольше
+    """
+    return min(config.RTT_MAX_TIMEOUT, timeout * 2 ** (attempt - 1))
+
+
+# Оценки процесса: сохраняются между сеансами обнаружения
+icmp_rtt = RttTable(config.PING_TIMEOUT, config.PING_RETRIES)
+snmp_rtt = RttTable(config.SNMP_TIMEOUT, config.SNMP_RETRIES)
@@ -0,0 +1,83 @@
+from typing import Any, Hashable, Optional
+from collections import OrderedDict
+import time
+import config
+
+
+class SessionPool:
+    """
+    Класс хранит авторизованные сессии с устройствами между передачами
+    команд. Сессия выдается только одному пользователю, перед выдачей
+    проверяется ее работоспособность. Сессии, не использованные дольше
+    idle_timeout, закрываются, при превышении max_sessions закрываются
+    самые давно использованные.
+    """
+    def __init__(
+        self,
+        max_sessions: Optional[int] = config.SESSION_POOL_SIZE,
+        idle_timeout: Optional[int | float] = config.SESSION_IDLE_TIMEOUT,
+        check_timeout: Optional[int | float] = config.SESSION_CHECK_TIMEOUT
+    ):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.check_timeout = check_timeout
+        # Ключ устройства -> (сессия, время последнего использования)
+        self._idle: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._idle)
+
+    async def acquire(self, key: Hashable) -> Optional[Any]:
+        """
+        Функция возвращает работоспособную сессию с устройством
+        или None, если ее нет
+        """
+        self.expire()
+        entry = self._idle.pop(key, None)
+        if entry is None:
+            return None
+        session = entry[0]
+        if await session.check(self.check_timeout):
+            return session
+        session.close()
+        return None
+
+    def release(self, key: Hashable, session: Any) -> None:
+        """
+        Функция возвращает сессию в пул для повторного использования
+        """
+        if not session.is_open():
+            session.close()
+            return
+        old = self._idle.pop(key, None)
+        if old is not None:
+            old[0].close()
+        self._idle[key] = (session, time.monotonic())
+        while len(self._idle) > self.max_sessions:
+            _, (evicted, _) = self._idle.popitem(last=False)
+            evicted.close()
+
+    def expire(self) -> int:
+        """
+        Функция закрывает сессии, не использованные дольше idle_timeout,
+        и возвращает их количество
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        expired = 0
+        # Сессии упорядочены по времени возврата в пул
+        while self._idle:
+            key, (session, last_used) = next(iter(self._idle.items()))
+            if last_used > deadline:
+                break
+            del self._idle[key]
+            session.close()
+            expired += 1
+        return expired
+
+    def close(self) -> None:
+        """
+        Функция закрывает все сессии пула
+        """
+        while self._idle:
+            _, (session, _) = self._idle.popitem()
+            session.close()
@@ -0,0 +1,401 @@
+"""
+Обнаружение устройств несколькими процессами.
+
+Основной процесс выдает адреса порциями процессам-обработчикам
+по мере их освобождения и получает от них записи об устройствах.
+Каждый обработчик - отдельный интерпретатор
+
+    python -m ndce.shard [--workers N] [--share K]
+
+со своим циклом событий, icmp и snmp сокетами и регулятором.
+Общие ограничения конфигурации (MAX_CONCURRENT, PROBE_RATE,
+PROBE_CONNECTIONS) делятся между K обработчиками. Обмен идет кадрами
+через stdin и stdout обработчика: байт типа, длина и данные. Адреса передаются упакованными,
+записи об устройствах - списками значений без имен полей.
+"""
+from typing import (
+    Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional,
+    Set, Tuple
+)
+import argparse
+import asyncio
+import itertools
+import os
+import pickle
+import socket
+import struct
+import sys
+from ndce import metrics
+import config
+
+
+# Типы кадров
+READY = b'R'    # обработчик готов принять порцию адресов
+HOSTS = b'H'    # порция адресов
+END = b'E'      # адресов больше нет
+DEVICES = b'D'  # записи об устройствах
+FAILED = b'F'   # не ответившие адреса
+SKIPPED = b'K'  # адреса, которые не опрашивались
+STATUS = b'S'   # состояние обработчика и изменения его метрик
+DONE = b'Z'     # обработчик завершил работу
+
+_HEADER = struct.Struct('!cI')
+# Признак адреса, который только проверяется по icmp
+_PING_ONLY = 0x80
+
+
+def pack_hosts(hosts: Iterable[Tuple[str, bool]]) -> bytes:
+    """
+    Функция упаковывает пары адрес - признак опроса: байт длины адреса
+    с признаком и адрес в двоичном виде
+    """
+    parts = []
+    for host, probe in hosts:
+        try:
+            address = socket.inet_pton(socket.AF_INET, host)
+        except OSError:
+            address = socket.inet_pton(socket.AF_INET6, host)
+        parts.append(bytes((len(address) | (0 if probe else _PING_ONLY),)))
+        parts.append(address)
+    return b''.join(parts)
+
+
+def unpack_hosts(data: bytes) -> Iterator[Tuple[str, bool]]:
+    """
+    Функция распаковывает пары адрес - признак опроса
+    """
+    offset = 0
+    while offset < len(data):
+        flags = data[offset]
+        size = flags & 0x7f
+        address = data[offset + 1:offset + 1 + size]
+        offset += 1 + size
+        family = socket.AF_INET if size == 4 else socket.AF_INET6
+        yield socket.inet_ntop(family, address), not flags & _PING_ONLY
+
+
+def write_frame(writer: asyncio.StreamWriter, kind: bytes, payload: bytes = b'') -> None:
+    writer.write(_HEADER.pack(kind, len(payload)) + payload)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+    kind, size = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return kind, await reader.readexactly(size) if size else b''
+
+
+def _row_fields() -> Tuple[str, ...]:
+    from ndce.discovery import make_row
+    return tuple(make_row({}, {}, 0))
+
+
+class ShardedDiscovery:
+    """
+    Класс обнаруживает устройства несколькими процессами. Функции
+    on_device, on_failed и skip вызываются в основном процессе так же,
+    как при обнаружении функцией discover_hosts.
+    Адреса, выданные обработчику, учитываются до получения результата
+    по каждому из них. Необработанные адреса прерванного обработчика
+    передаются остальным, а если их не осталось - считаются не ответившими.
+    """
+    def __init__(
+        self,
+        processes: Optional[int] = config.DISCOVERY_PROCESSES,
+        workers: Optional[int] = None
+    ):
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.workers = workers
+        # Номер обработчика - опрашиваемые устройства и ограничение
+        self._status: Dict[int, Tuple[int, int]] = {}
+        # Номер обработчика - выданные ему адреса без результата
+        # и признак их опроса
+        self._outstanding: Dict[int, Dict[str, bool]] = {}
+        # Адреса прерванных обработчиков для выдачи остальным
+        self._retry: List[Tuple[str, bool]] = []
+        # Обработчики, ожидающие адресов, и каналы к ним
+        self._waiting: Set[int] = set()
+        self._channels: Dict[int, asyncio.StreamWriter] = {}
+        self._targets: Iterator[str] = iter(())
+        self._skip: Optional[Callable[[str], bool]] = None
+
+    @property
+    def in_flight(self) -> int:
+        return sum(in_flight for in_flight, _ in self._status.values())
+
+    @property
+    def concurrency(self) -> int:
+        return sum(limit for _, limit in self._status.values())
+
+    async def run(
+        self,
+        targets: Iterable[str],
+        on_device: Callable[[Dict[str, Any]], None],
+        on_failed: Optional[Callable[[str], None]] = None,
+        skip: Optional[Callable[[str], bool]] = None
+    ) -> None:
+        """
+        Функция обнаруживает устройства среди заданных адресов.
+        Если все обработчики прерваны до выдачи всех адресов,
+        вызывается исключение ConnectionError.
+        """
+        self._targets = iter(targets)
+        self._skip = skip
+        command = [
+            sys.executable, '-m', 'ndce.shard', '--share', str(self.processes)
+        ]
+        if self.workers:
+            command.extend(['--workers', str(self.workers)])
+        processes = []
+        try:
+            for _ in range(self.processes):
+                processes.append(await asyncio.create_subprocess_exec(
+                    *command,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    # Пути конфигурации заданы относительно каталога приложения
+                    cwd=os.path.dirname(os.path.abspath(config.__file__))
+                ))
+            await asyncio.gather(*(
+                self._serve(index, process, on_device, on_failed)
+                for index, process in enumerate(processes)
+            ))
+        finally:
+            for process in processes:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                metrics.REGISTRY.forget(process.pid)
+            retry, self._retry = self._retry, []
+            self._status.clear()
+            self._outstanding.clear()
+            self._waiting.clear()
+            self._channels.clear()
+        if retry:
+            # Адреса прерванного обработчика, которые некому передать
+            print(f'Не опрошено адресов прерванных процессов: {len(retry)}')
+            if on_failed:
+                for host, _ in retry:
+                    on_failed(host)
+        if next(self._targets, None) is not None:
+            raise ConnectionError('Процессы обнаружения прерваны')
+
+    def _dispatch(self, index: int) -> None:
+        """
+        Функция выдает обработчику порцию адресов: сначала адреса
+        прерванных обработчиков, затем следующие заданные. Если адресов
+        больше нет, но другие обработчики еще не закончили свои порции,
+        обработчик ожидает: их адреса могут понадобиться передать ему.
+        """
+        chunk = self._retry[:config.DISCOVERY_CHUNK_SIZE]
+        del self._retry[:len(chunk)]
+        if len(chunk) < config.DISCOVERY_CHUNK_SIZE:
+            chunk.extend(
+                (host, not (self._skip and self._skip(host)))
+                for host in itertools.islice(
+                    self._targets, config.DISCOVERY_CHUNK_SIZE - len(chunk)
+                )
+            )
+        channel = self._channels[index]
+        if chunk:
+            self._outstanding.setdefault(index, {}).update(chunk)
+            write_frame(channel, HOSTS, pack_hosts(chunk))
+        elif any(
+            hosts for other, hosts in self._outstanding.items() if other != index
+        ):
+            self._waiting.add(index)
+        else:
+            write_frame(channel, END)
+
+    def _wake(self) -> None:
+        """
+        Функция выдает адреса ожидающим обработчикам
+        """
+        for index in list(self._waiting):
+            self._waiting.discard(index)
+            self._dispatch(index)
+
+    def _done(self, index: int, hosts: Iterable[str]) -> None:
+        outstanding = self._outstanding.get(index)
+        if outstanding is None:
+            return
+        for host in hosts:
+            outstanding.pop(host, None)
+        if not outstanding and self._waiting:
+            self._wake()
+
+    async def _serve(
+        self,
+        index: int,
+        process: asyncio.subprocess.Process,
+        on_device: Callable[[Dict[str, Any]], None],
+        on_failed: Optional[Callable[[str], None]]
+    ) -> None:
+        fields = _row_fields()
+        host_field = fields.index('host')
+        self._channels[index] = process.stdin
+        try:
+            while True:
+                kind, payload = await read_frame(process.stdout)
+                if kind == READY:
+                    self._dispatch(index)
+                    await process.stdin.drain()
+                elif kind == DEVICES:
+                    rows = pickle.loads(payload)
+                    self._done(index, (values[host_field] for values in rows))
+                    for values in rows:
+                        on_device(dict(zip(fields, values)))
+                elif kind == FAILED:
+                    hosts = [host for host, _ in unpack_hosts(payload)]
+                    self._done(index, hosts)
+                    if on_failed:
+                        for host in hosts:
+                            on_failed(host)
+                elif kind == SKIPPED:
+                    self._done(index, (host for host, _ in unpack_hosts(payload)))
+                elif kind == STATUS:
+                    in_flight, limit, changes = pickle.loads(payload)
+                    self._status[index] = (in_flight, limit)
+                    metrics.REGISTRY.merge(changes, process.pid)
+                elif kind == DONE:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError) as err:
+            print(f'Процесс обнаружения {process.pid} прерван', err)
+            # Выданные обработчику адреса передаются остальным
+            self._retry.extend(self._outstanding.get(index, {}).items())
+        finally:
+            self._status.pop(index, None)
+            self._outstanding.pop(index, None)
+            self._waiting.discard(index)
+            self._channels.pop(index, None)
+            # Показатели прерванного обработчика не должны оставаться в сумме
+            metrics.REGISTRY.forget(process.pid)
+        self._wake()
+        process.stdin.close()
+        await process.wait()
+
+
+async def serve(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    workers: Optional[int] = None
+) -> None:
+    """
+    Функция обработчика: запрашивает порции адресов, обнаруживает
+    устройства и передает результаты основному процессу
+    """
+    from ndce.control import get_controller
+    from ndce.discovery import discover_hosts
+    fields = _row_fields()
+    ping_only: Set[str] = set()
+    rows: List[Tuple[Any, ...]] = []
+    failed: List[str] = []
+    skipped: List[str] = []
+
+    async def hosts() -> AsyncIterator[str]:
+        write_frame(writer, READY)
+        while True:
+            kind, payload = await read_frame(reader)
+            if kind != HOSTS:
+                return
+            # Следующая порция запрашивается до обработки текущей,
+            # чтобы обработчик не простаивал в ожидании
+            write_frame(writer, READY)
+            for host, probe in unpack_hosts(payload):
+                if not probe:
+                    ping_only.add(host)
+                yield host
+
+    def on_device(row: Dict[str, Any]) -> None:
+        rows.append(tuple(row[field] for field in fields))
+
+    def on_failed(host: str) -> None:
+        ping_only.discard(host)
+        failed.append(host)
+
+    def skip(host: str) -> bool:
+        if host in ping_only:
+            ping_only.discard(host)
+            skipped.append(host)
+            return True
+        return False
+
+    def flush() -> None:
+        if rows:
+            write_frame(writer, DEVICES, pickle.dumps(rows, pickle.HIGHEST_PROTOCOL))
+            rows.clear()
+        if failed:
+            write_frame(writer, FAILED, pack_hosts((host, True) for host in failed))
+            failed.clear()
+        if skipped:
+            write_frame(writer, SKIPPED, pack_hosts((host, False) for host in skipped))
+            skipped.clear()
+        limit = workers or get_controller().concurrency
+        in_flight = int(metrics.WORKERS_BUSY.get(pool='discover'))
+        write_frame(writer, STATUS, pickle.dumps(
+            (in_flight, limit, metrics.REGISTRY.changes()),
+            pickle.HIGHEST_PROTOCOL
+        ))
+
+    async def flush_periodically() -> None:
+        while True:
+            await asyncio.sleep(config.DISCOVERY_FLUSH_INTERVAL)
+            flush()
+            await writer.drain()
+
+    flusher = asyncio.create_task(flush_periodically())
+    try:
+        await discover_hosts(hosts(), on_device, on_failed, skip, workers)
+    finally:
+        flusher.cancel()
+    flush()
+    write_frame(writer, DONE)
+    await writer.drain()
+
+
+async def _main(channel: int, workers: Optional[int]) -> None:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(0, 'rb', 0)
+    )
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, os.fdopen(channel, 'wb', 0)
+    )
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    await serve(reader, writer, workers)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m ndce.shard')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--share', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    # Общие ограничения делятся между обработчиками до импорта модулей
+    # опроса: значения по умолчанию их функций берутся из конфигурации
+    share = max(1, args.share)
+    config.MAX_CONCURRENT = max(config.CONCURRENCY_MIN, config.MAX_CONCURRENT // share)
+    config.CONCURRENCY_INITIAL = max(
+        config.CONCURRENCY_MIN, config.CONCURRENCY_INITIAL // share
+    )
+    if config.PROBE_RATE:
+        config.PROBE_RATE = config.PROBE_RATE / share
+    config.PROBE_BURST = max(1, config.PROBE_BURST // share)
+    config.PROBE_CONNECTIONS = max(1, config.PROBE_CONNECTIONS // share)
+
+    # Стандартный вывод - канал результатов, диагностика модулей
+    # выводится в поток ошибок
+    channel = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        asyncio.run(_main(channel, args.workers))
+    except KeyboardInterrupt:
+        return 130
+    except ConnectionError as err:
+        # Основной процесс передаст выданные адреса другим обработчикам
+        print(err)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,51 +1,272 @@
-from typing import Dict, Optional, Any, List
+from typing import Deque, Dict, Optional, Any, List, Tuple
 import asyncio
-import aiosnmp
-from ndce.icmp import ping_host
+import collections
+import itertools
+import random
+import time
+from ndce import ber, metrics
+from ndce.control import get_controller, get_rate_limiter
+from ndce.rtt import RttTable, snmp_rtt
+from ndce.oid import classify
+from ndce.descr import parse_description
 import config
 
 
+class _SnmpProtocol(asyncio.DatagramProtocol):
+    """
+    Протокол общего udp сокета, передающий ответы движку snmp
+    """
+    def __init__(self, engine: 'SnmpEngine'):
+        self.engine = engine
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self.engine.response_received(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        print(exc)
+
+
+class SnmpEngine:
+    """
+    Класс выполняет snmp запросы ко множеству устройств через общие
+    udp сокеты. Ответы сопоставляются с запросами только по request-id,
+    без проверки адреса отправителя, таймаут и повторы отсчитываются
+    для каждого запроса отдельно.
+    Если таймаут и количество попыток не заданы, они вычисляются
+    по оценке времени ответа и потерь в подсети устройства.
+    """
+    def __init__(
+        self,
+        sockets: Optional[int] = config.SNMP_SOCKETS,
+        rtt: Optional[RttTable] = None
+    ):
+        self.sockets = max(1, sockets)
+        self.rtt = rtt or snmp_rtt
+        self.loop = None
+        self.transports = []
+        self.transports6 = []
+        self._request_id = itertools.count(random.randrange(1, 0x3fffffff))
+        self._requests: Dict[int, Tuple[Tuple[str, int], asyncio.Future]] = {}
+        # Запросы, ответ на которые не дождались, и срок их хранения:
+        # опоздавший ответ уточняет оценку времени ответа
+        self._late: Dict[int, Tuple[Tuple[str, int], float]] = {}
+        self._late_expires: Deque[Tuple[float, int]] = collections.deque()
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> 'SnmpEngine':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.close()
+
+    async def open(self) -> None:
+        """
+        Функция открывает общие udp сокеты для IPv4 и IPv6.
+        Если IPv6 недоступен, запросы устройствам IPv6 завершаются ошибкой.
+        """
+        async with self._lock:
+            if self.transports:
+                return
+            self.loop = asyncio.get_running_loop()
+            for _ in range(self.sockets):
+                transport, _ = await self.loop.create_datagram_endpoint(
+                    lambda: _SnmpProtocol(self), local_addr=('0.0.0.0', 0)
+                )
+                self.transports.append(transport)
+            try:
+                for _ in range(self.sockets):
+                    transport, _ = await self.loop.create_datagram_endpoint(
+                        lambda: _SnmpProtocol(self), local_addr=('::', 0)
+                    )
+                    self.transports6.append(transport)
+            except OSError as err:
+                print('IPv6', err)
+
+    def close(self) -> None:
+        """
+        Функция закрывает общие udp сокеты и отменяет ожидающие запросы
+        """
+        for transport in self.transports + self.transports6:
+            transport.close()
+        self.transports.clear()
+        self.transports6.clear()
+        for _, future in self._requests.values():
+            future.cancel()
+        self._requests.clear()
+        self._late.clear()
+        self._late_expires.clear()
+
+    def _next_request_id(self) -> int:
+        while True:
+            request_id = next(self._request_id) & 0x7fffffff
+            if request_id and request_id not in self._requests:
+                return request_id
+
+    def response_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        """
+        Функция передает полученный ответ ожидающему его запросу
+        """
+        try:
+            _, pdu_type, request_id, error_status, _, varbinds = (
+                ber.decode_message(data)
+            )
+        except Exception as err:
+            print(addr[0], err)
+            return
+        request = self._requests.get(request_id)
+        if request is None:
+            late = self._late.pop(request_id, None)
+            if late:
+                self.rtt.update(late[0][0], time.perf_counter() - late[1])
+                get_controller().congestion()
+            return
+        # Адрес отправителя не проверяется: устройства с несколькими
+        # интерфейсами отвечают с адреса loopback или исходящего
+        # интерфейса, а request-id уникален для каждой попытки
+        if request[1].done():
+            return
+        if pdu_type != ber.GET_RESPONSE:
+            return
+        if error_status:
+            request[1].set_exception(
+                RuntimeError(f'Ошибка snmp, статус {error_status}')
+            )
+        else:
+            request[1].set_result((request_id, varbinds))
+
+    async def get(
+        self,
+        host: str,
+        oids: List[str],
+        port: Optional[int] = config.SNMP_PORT,
+        community: Optional[str] = config.SNMP_COMMUNITY,
+        timeout: Optional[int | float] = None,
+        retries: Optional[int] = None
+    ) -> List[Any]:
+        """
+        Функция возвращает значения заданных oid устройства
+        """
+        await self.open()
+        adaptive = config.RTT_ADAPTIVE and timeout is None
+        if timeout is None:
+            timeout = self.rtt.timeout(host) if adaptive else config.SNMP_TIMEOUT
+        if retries is None:
+            if config.RTT_ADAPTIVE:
+                retries = self.rtt.attempts(host)
+            else:
+                retries = config.SNMP_RETRIES
+        # Сокет выбирается по семейству адреса устройства
+        transports = self.transports6 if ':' in host else self.transports
+        if not transports:
+            raise OSError(f'IPv6 недоступен: {host}')
+        future = self.loop.create_future()
+        # Каждая попытка отправляется со своим request-id, чтобы
+        # по ответу определить попытку и время ответа на нее
+        sent: Dict[int, Tuple[float, int]] = {}
+        try:
+            with metrics.measure('snmp'):
+                for attempt in range(1, max(1, retries) + 1):
+                    request_id = self._next_request_id()
+                    self._requests[request_id] = ((host, port), future)
+                    message = ber.encode_message(
+                        community,
+                        ber.GET_REQUEST,
+                        request_id,
+                        [(oid, None) for oid in oids]
+                    )
+                    transport = transports[request_id % len(transports)]
+                    await get_rate_limiter().take()
+                    sent[request_id] = (time.perf_counter(), attempt)
+                    transport.sendto(message, (host, port))
+                    if adaptive:
+                        wait = self.rtt.wait(host, attempt, retries)
+                    else:
+                        wait = timeout
+                    done, _ = await asyncio.wait({future}, timeout=wait)
+                    if done:
+                        request_id, varbinds = future.result()
+                        started, answered = sent[request_id]
+                        self.rtt.update(
+                            host, time.perf_counter() - started, answered
+                        )
+                        if answered == 1:
+                            get_controller().success()
+                        else:
+                            get_controller().congestion()
+                        return [value for _, value in varbinds]
+                raise asyncio.TimeoutError(f'Нет ответа snmp от {host}')
+        finally:
+            for request_id in sent:
+                self._requests.pop(request_id, None)
+            if not future.done():
+                future.cancel()
+                self._expect_late(host, port, sent)
+
+    def _expect_late(
+        self, host: str, port: int, sent: Dict[int, Tuple[float, int]]
+    ) -> None:
+        now = time.perf_counter()
+        while self._late_expires and self._late_expires[0][0] < now:
+            self._late.pop(self._late_expires.popleft()[1], None)
+        for request_id, (started, _) in sent.items():
+            self._late[request_id] = ((host, port), started)
+            self._late_expires.append((now + config.RTT_MAX_TIMEOUT, request_id))
+
+
+_engine: Optional[SnmpEngine] = None
+
+
+def get_snmp_engine() -> SnmpEngine:
+    """
+    Функция возвращает общий для процесса движок snmp
+    """
+    global _engine
+    loop = asyncio.get_running_loop()
+    if _engine is None or (_engine.loop and _engine.loop is not loop):
+        _engine = SnmpEngine()
+    return _engine
+
+
 async def get_snmp_values(
     oids: List[str],
     host: str,
-    semaphore: asyncio.Semaphore,
+    semaphore: Optional[asyncio.Semaphore] = None,
     port: Optional[int] = config.SNMP_PORT,
     community: Optional[str] = config.SNMP_COMMUNITY,
-    timeout: Optional[int] = config.SNMP_TIMEOUT,
-    retries: Optional[int] = config.SNMP_RETRIES
+    timeout: Optional[int | float] = None,
+    retries: Optional[int] = None
 ) -> Any:
     """
     Функция для получения данных по протоколу snmp
     """
-    async with semaphore:
-        values = []
-        host_is_up = await ping_host(host)
-        if host_is_up:
-            try:
-                async with aiosnmp.Snmp(
-                    host=host,
-                    port=port,
-                    community=community,
-                    timeout=timeout,
-                    retries=retries,
-                    validate_source_addr=False
-                ) as snmp:
-                    results = await snmp.get(oids)
-                    for result in results:
-                        # Возвращаемое значение может быть в формате байт строк
-                        if isinstance(result.value, bytes):
-                            values.append(result.value.decode('utf-8'))
-                        else:
-                            values.append(str(result.value))
-            except Exception as err:
-                print(host, err)
-        return values
+    values = []
+    try:
+        if semaphore:
+            async with semaphore:
+                results = await get_snmp_engine().get(
+                    host, oids, port, community, timeout, retries
+                )
+        else:
+            results = await get_snmp_engine().get(
+                host, oids, port, community, timeout, retries
+            )
+        for result in results:
+            # Возвращаемое значение может быть в формате байт строк
+            if isinstance(result, bytes):
+                values.append(result.decode('utf-8', 'replace'))
+            elif result is None:
+                values.append('')
+            else:
+                values.append(str(result))
+    except Exception as err:
+        print(host, err)
+    return values
 
 
 async def get_device_info(
     host: str,
-    semaphore: asyncio.Semaphore,
-    ids: List[Dict[str, str]]
+    semaphore: Optional[asyncio.Semaphore] = None
 ) -> Dict[str, str]:
     """
     Функция возвращает значения hostname, description и sysobjectid
@@ -64,25 +285,11 @@ async def get_device_info(
             result['hostname'] = hostname
         if objectid:
             result['sysobjectid'] = objectid
-            if  objectid in config.MKT_SYS_OBJECT_IDS:
-                result['vendor'] = 'MikroTik'
-                if description:
-                    if objectid == config.MKT_SYS_OBJECT_IDS[0]:
-                        # RouterOS устройство
-                        # Маршрутизаторы MikroTik отдают SYS_DESCR
-                        # в формате 'RouterOS RB750GL'.
-                        # Необходимо удалить начальное RouterOS.
-                        result['model'] = ''.join(description.split()[1::])
-                        result['category'] = 'Router'
-                    elif objectid == config.MKT_SYS_OBJECT_IDS[1]:
-                        # SwOS устройство
-                        # Коммутаторы MikroTik отдают SYS_DESCR
-                        # в формате 'RB260GS'.
-                        # Оставляем как есть.
-                        result['model'] = description
-                        result['category'] = 'Switch'
-            elif objectid in ids.keys():
-                result['vendor'] = ids[objectid]['vendor']
-                result['model'] = ids[objectid]['model']
-                result['category'] = ids[objectid]['category']
-        return result
\ No newline at end of file
+            # Производитель и категория неизвестной модели определяются
+            # по ближайшему известному префиксу идентификатора
+            result.update(classify(objectid))
+            # Модель, не найденная по идентификатору, и версия прошивки
+            # извлекаются из описания по правилам производителя
+            for key, value in parse_description(objectid, description).items():
+                result.setdefault(key, value)
+        return result
@@ -0,0 +1,280 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import time
+import asyncssh
+from ndce.client import Client, DeviceUnreachable
+from ndce.expect import Expect, PromptTimeout
+from ndce import metrics
+import config
+
+
+class SshUnreachable(DeviceUnreachable):
+    """
+    Устройство не принимает соединение по ssh
+    """
+
+
+class SshChannels(asyncio.Semaphore):
+    """
+    Места для каналов одного ssh соединения. Хранит количество открытых
+    каналов и время последнего открытия или закрытия канала: соединение
+    с открытыми каналами не закрывается по простою.
+    """
+    def __init__(self, value: int):
+        super().__init__(value)
+        self.active = 0
+        self.last_used = time.monotonic()
+
+    async def acquire(self) -> bool:
+        await super().acquire()
+        self.active += 1
+        self.last_used = time.monotonic()
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self.last_used = time.monotonic()
+        super().release()
+
+
+class SshSession(Expect):
+    """
+    Сессия в интерактивном канале ssh соединения. Канал занимает место
+    среди каналов соединения, пока сессия не закрыта.
+    """
+    def __init__(
+        self,
+        process: asyncssh.SSHClientProcess,
+        channels: SshChannels,
+        profile: Optional[Dict[str, Any]] = None,
+        timeout: Optional[int | float] = config.SSH_COMMAND_TIMEOUT
+    ):
+        super().__init__(process.stdout, process.stdin, profile, timeout)
+        self.channels = channels
+        self.released = False
+
+    def close(self) -> None:
+        super().close()
+        if not self.released:
+            self.released = True
+            self.channels.release()
+
+
+class SshConnections:
+    """
+    Класс хранит ssh соединения с устройствами для повторного
+    использования. Все сессии и команды одного устройства выполняются
+    в отдельных каналах поверх одного соединения.
+    """
+    def __init__(
+        self,
+        max_channels: Optional[int] = config.SSH_MAX_CHANNELS,
+        idle_timeout: Optional[int | float] = config.SESSION_IDLE_TIMEOUT
+    ):
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self.loop = None
+        # Ключ устройства -> задача установления соединения
+        self._connections: Dict[Hashable, asyncio.Task] = {}
+        self._channels: Dict[Hashable, SshChannels] = {}
+
+    async def get(
+        self,
+        ip: str,
+        port: int,
+        username: str,
+        password: str
+    ) -> Tuple[asyncssh.SSHClientConnection, SshChannels]:
+        """
+        Функция возвращает открытое соединение с устройством и места,
+        ограничивающие количество одновременных каналов в нем
+        """
+        self.loop = asyncio.get_running_loop()
+        key = (ip, port, username)
+        task = self._connections.get(key)
+        if task is not None and task.done():
+            if task.cancelled() or task.exception() or task.result().is_closed():
+                task = None
+        if task is None:
+            # Одновременные запросы к одному устройству ожидают
+            # одно и то же соединение
+            task = asyncio.ensure_future(
+                asyncssh.connect(
+                    ip,
+                    port=port,
+                    username=username,
+                    password=password,
+                    known_hosts=config.SSH_KNOWN_HOSTS
+                )
+            )
+            self._connections[key] = task
+            self._channels[key] = SshChannels(self.max_channels)
+        channels = self._channels[key]
+        channels.last_used = time.monotonic()
+        try:
+            connection = await asyncio.wait_for(
+                asyncio.shield(task), config.SSH_CONNECT_TIMEOUT
+            )
+        except BaseException:
+            if self._connections.get(key) is task:
+                del self._connections[key]
+                task.cancel()
+            raise
+        return connection, channels
+
+    def expire(self) -> int:
+        """
+        Функция закрывает соединения без открытых каналов, в которых
+        каналы не открывались и не закрывались дольше idle_timeout,
+        и возвращает их количество
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        expired = 0
+        for key, channels in list(self._channels.items()):
+            if channels.active or channels.last_used > deadline:
+                continue
+            if self._close(key):
+                expired += 1
+        return expired
+
+    def _close(self, key: Hashable) -> bool:
+        self._channels.pop(key, None)
+        task = self._connections.pop(key, None)
+        if task is None:
+            return False
+        if task.done() and not task.cancelled() and not task.exception():
+            task.result().close()
+        else:
+            task.cancel()
+        return True
+
+    def close(self) -> None:
+        """
+        Функция закрывает все соединения
+        """
+        for key in list(self._channels):
+            self._close(key)
+
+
+_connections: Optional[SshConnections] = None
+
+
+def get_ssh_connections() -> SshConnections:
+    """
+    Функция возвращает общий для процесса набор ssh соединений
+    """
+    global _connections
+    loop = asyncio.get_running_loop()
+    if _connections is None or (_connections.loop and _connections.loop is not loop):
+        _connections = SshConnections()
+    return _connections
+
+
+class Ssh(Client):
+    transport = 'ssh'
+
+    def __init__(
+        self,
+        ip,
+        username = config.USERNAME,
+        password = config.PASSWORD,
+        commands = [],
+        sysobjectid = None,
+        port = config.SSH_PORT
+    ):
+        super().__init__(ip, username, password, commands, sysobjectid, port)
+
+    async def open(self):
+        """
+        Функция возвращает соединение с устройством из общего набора.
+        Недоступность устройства сообщается исключением SshUnreachable.
+        """
+        try:
+            with metrics.measure('ssh_connect'):
+                return await get_ssh_connections().get(
+                    self.ip,
+                    self.port,
+                    self.username + self.profile['username_suffix'],
+                    self.password
+                )
+        except asyncssh.PermissionDenied as err:
+            raise PermissionError('Неверные учетные данные') from err
+        except (OSError, asyncio.TimeoutError, asyncssh.Error) as err:
+            raise SshUnreachable(
+                f'Устройство {self.ip} недоступно по ssh'
+            ) from err
+
+    async def login(self):
+        """
+        Функция открывает интерактивный канал в соединении с устройством,
+        дожидается приглашения командной строки и возвращает сессию.
+        Канал открывается, только когда в соединении есть свободное место.
+        """
+        connection, channels = await self.open()
+        try:
+            return await self._login(connection, channels)
+        except PromptTimeout:
+            # Приглашение не дождались раньше, чем истекло время входа
+            raise
+        except asyncio.TimeoutError as err:
+            raise asyncio.TimeoutError(
+                f'Превышено время входа {config.SSH_LOGIN_TIMEOUT} с'
+            ) from err
+
+    async def _login(
+        self, connection: asyncssh.SSHClientConnection, channels: SshChannels
+    ) -> SshSession:
+        with metrics.measure('ssh_login'):
+            await asyncio.wait_for(channels.acquire(), config.SSH_LOGIN_TIMEOUT)
+            try:
+                process = await asyncio.wait_for(
+                    connection.create_process(
+                        term_type=config.SSH_TERM_TYPE,
+                        encoding='utf-8',
+                        errors='replace'
+                    ),
+                    config.SSH_LOGIN_TIMEOUT
+                )
+            except BaseException:
+                channels.release()
+                raise
+            session = SshSession(
+                process, channels, self.profile, config.SSH_COMMAND_TIMEOUT
+            )
+            try:
+                await asyncio.wait_for(
+                    session.expect([self.profile['prompt']]),
+                    config.SSH_LOGIN_TIMEOUT
+                )
+            except BaseException:
+                session.close()
+                raise
+        return session
+
+    async def exec_commands(self, pool: Optional[Any] = None) -> List[Tuple[str, str]]:
+        """
+        Функция выполняет независимые команды одновременно, каждую
+        в отдельном канале одного соединения, и возвращает список пар
+        команда - вывод в исходном порядке. Пул сессий не используется:
+        соединения устройств хранятся в общем наборе.
+        """
+        connection, channels = await self.open()
+
+        async def run(command: str) -> Tuple[str, Any]:
+            async with channels:
+                with metrics.measure('ssh_command'):
+                    try:
+                        result = await asyncio.wait_for(
+                            connection.run(command, check=False),
+                            config.SSH_COMMAND_TIMEOUT
+                        )
+                    except asyncio.TimeoutError as err:
+                        raise asyncio.TimeoutError(
+                            f'Превышено время выполнения команды {command} '
+                            f'{config.SSH_COMMAND_TIMEOUT} с'
+                        ) from err
+            return command, result.stdout
+
+        commands = [command.strip() for command in self.commands if command.strip()]
+        self.outputs = list(await asyncio.gather(*map(run, commands)))
+        return self.outputs
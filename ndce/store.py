@@ -0,0 +1,255 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import bisect
+import ipaddress
+import itertools
+import socket
+
+
+class DeviceStore:
+    """
+    Класс хранит устройства в памяти с ключом по ip адресу
+    и поддерживает вторичные индексы по значениям заданных полей.
+    Добавление, удаление, проверка наличия и подсчет значений полей
+    выполняются без полного перебора базы. Для постраничной выдачи
+    с сортировкой поддерживаются упорядоченные индексы полей: индекс
+    строится при первой сортировке по полю и далее обновляется
+    при каждом изменении.
+    """
+    INDEXED_FIELDS = ('category', 'vendor', 'model', 'telnet', 'ssh')
+
+    def __init__(
+        self,
+        rows: Iterable[Dict[str, Any]] = (),
+        fields: Optional[Iterable[str]] = INDEXED_FIELDS
+    ):
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        # Порядковые номера устройств для сохранения порядка добавления
+        self._positions: Dict[str, int] = {}
+        self._counter = itertools.count()
+        self._indexes: Dict[str, Dict[Any, Set[str]]] = {
+            field: {} for field in fields
+        }
+        # Поле -> отсортированный список (ключ, порядковый номер, ip адрес)
+        self._orders: Dict[str, List[Tuple[Any, int, str]]] = {}
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, host: str) -> bool:
+        return host in self._rows
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._rows.values())
+
+    def get(self, host: str) -> Optional[Dict[str, Any]]:
+        """
+        Функция возвращает устройство по ip адресу
+        """
+        return self._rows.get(host)
+
+    @staticmethod
+    def sort_key(field: str, row: Dict[str, Any]) -> Any:
+        """
+        Функция возвращает ключ сортировки устройства по полю:
+        ip адреса сравниваются численно, остальные значения - как строки
+        без учета регистра
+        """
+        value = row.get(field)
+        if field == 'host':
+            try:
+                return int.from_bytes(socket.inet_aton(value), 'big')
+            except (OSError, TypeError):
+                pass
+            # IPv6 адреса следуют за IPv4
+            try:
+                return (1 << 32) + int(ipaddress.ip_address(value))
+            except ValueError:
+                return -1
+        return '' if value is None else str(value).casefold()
+
+    def _entry(self, field: str, row: Dict[str, Any]) -> Tuple[Any, int, str]:
+        host = row['host']
+        return self.sort_key(field, row), self._positions[host], host
+
+    def _index(self, row: Dict[str, Any]) -> None:
+        for field, index in self._indexes.items():
+            index.setdefault(row.get(field), set()).add(row['host'])
+        for field, order in self._orders.items():
+            bisect.insort(order, self._entry(field, row))
+
+    def _unindex(self, row: Dict[str, Any]) -> None:
+        for field, index in self._indexes.items():
+            value = row.get(field)
+            members = index.get(value)
+            if members is not None:
+                members.discard(row['host'])
+                if not members:
+                    del index[value]
+        for field, order in self._orders.items():
+            entry = self._entry(field, row)
+            position = bisect.bisect_left(order, entry)
+            if position < len(order) and order[position] == entry:
+                del order[position]
+
+    def add(self, row: Dict[str, Any]) -> bool:
+        """
+        Функция добавляет устройство, если его еще нет в базе
+        """
+        host = row['host']
+        if host in self._rows:
+            return False
+        self._rows[host] = row
+        self._positions[host] = next(self._counter)
+        self._index(row)
+        return True
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Функция добавляет устройства за один проход
+        и возвращает количество добавленных
+        """
+        # Упорядоченные индексы перестраиваются после загрузки целиком,
+        # а не вставкой каждого устройства
+        self._orders.clear()
+        add = self.add
+        return sum(add(row) for row in rows)
+
+    def update(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Функция добавляет устройство или обновляет поля существующего
+        и возвращает хранимую запись. Запись существующего устройства
+        изменяется на месте, поэтому ссылки на нее остаются актуальными.
+        """
+        old = self._rows.get(row['host'])
+        if old is None:
+            self.add(row)
+            return row
+        self._unindex(old)
+        old.update(row)
+        self._index(old)
+        return old
+
+    def remove(self, hosts: Iterable[str]) -> int:
+        """
+        Функция удаляет устройства с заданными ip адресами
+        и возвращает количество удаленных
+        """
+        removed = 0
+        for host in hosts:
+            row = self._rows.pop(host, None)
+            if row is not None:
+                self._unindex(row)
+                del self._positions[host]
+                removed += 1
+        return removed
+
+    def clear(self) -> None:
+        """
+        Функция очищает базу и индексы
+        """
+        self._rows.clear()
+        self._positions.clear()
+        self._orders.clear()
+        for index in self._indexes.values():
+            index.clear()
+
+    @staticmethod
+    def matches(row: Dict[str, Any], criteria: Dict[str, Any]) -> bool:
+        """
+        Функция проверяет, соответствует ли устройство заданным условиям
+        """
+        return all(row.get(field) == value for field, value in criteria.items())
+
+    def select(self, criteria: Dict[str, Any]) -> Optional[Set[str]]:
+        """
+        Функция возвращает множество ip адресов устройств, поля которых
+        равны заданным значениям. Без условий возвращается None,
+        что означает все устройства базы.
+        """
+        if not criteria:
+            return None
+        # Пересечение начинается с самого малого множества
+        members = sorted(
+            (
+                self._indexes[field].get(value, set())
+                for field, value in criteria.items()
+            ),
+            key=len
+        )
+        result = set(members[0])
+        for other in members[1:]:
+            result &= other
+            if not result:
+                break
+        return result
+
+    def rows(self, hosts: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Функция возвращает устройства в порядке добавления
+        """
+        if hosts is None:
+            return list(self._rows.values())
+        return [
+            self._rows[host]
+            for host in sorted(hosts, key=self._positions.__getitem__)
+        ]
+
+    def facets(
+        self, field: str, hosts: Optional[Set[str]] = None
+    ) -> Dict[Any, int]:
+        """
+        Функция возвращает значения поля и количество устройств с каждым
+        значением среди всех или заданных устройств
+        """
+        index = self._indexes[field]
+        if hosts is None:
+            return {value: len(members) for value, members in index.items()}
+        counts = {}
+        for value, members in index.items():
+            # Пересечение множеств перебирает меньшее из них
+            count = len(members & hosts)
+            if count:
+                counts[value] = count
+        return counts
+
+    def _order(self, field: str) -> List[Tuple[Any, int, str]]:
+        order = self._orders.get(field)
+        if order is None:
+            order = sorted(self._entry(field, row) for row in self._rows.values())
+            self._orders[field] = order
+        return order
+
+    def page(
+        self,
+        hosts: Optional[Set[str]] = None,
+        sort_by: Optional[str] = None,
+        descending: bool = False,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Функция возвращает страницу устройств из всех или заданных,
+        упорядоченных по полю sort_by или, без него, по порядку добавления.
+        Перебирается только начало упорядоченного индекса до конца
+        страницы, а не вся выборка.
+        """
+        stop = offset + limit if limit else None
+        if hosts is not None and len(hosts) * 16 < len(self._rows):
+            # Малая выборка сортируется сама, без обхода индекса
+            if sort_by is None:
+                key = self._positions.__getitem__
+            else:
+                key = lambda host: self._entry(sort_by, self._rows[host])
+            ordered = sorted(hosts, key=key, reverse=descending)
+            return [self._rows[host] for host in ordered[offset:stop]]
+        if sort_by is None:
+            ordered = reversed(self._rows) if descending else iter(self._rows)
+        else:
+            order = self._order(sort_by)
+            ordered = (
+                entry[2] for entry in (reversed(order) if descending else order)
+            )
+        if hosts is not None:
+            ordered = (host for host in ordered if host in hosts)
+        return [self._rows[host] for host in itertools.islice(ordered, offset, stop)]
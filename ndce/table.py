@@ -0,0 +1,125 @@
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+from nicegui import ui
+from nicegui.events import GenericEventArguments
+
+
+class DiffTable(ui.table, component='diff_table.js'):
+    """
+    Таблица передает в браузер только изменения строк. Каждая строка
+    хранит номер версии, в которой она последний раз изменилась,
+    удаленные строки - номер версии удаления. Браузер подтверждает
+    примененную версию, следующее обновление содержит строки, измененные
+    после подтвержденной версии. Полный набор строк передается только
+    при подключении браузера или при пропуске им изменений.
+    """
+    def __init__(self, *, rows: Iterable[Dict[str, Any]] = (), **kwargs: Any):
+        super().__init__(rows=[], **kwargs)
+        # Ключ строки -> копия строки в том виде, в котором она передана
+        self._current: Dict[Hashable, Dict[str, Any]] = {}
+        self._live: List[Dict[str, Any]] = []
+        self._order: List[Hashable] = []
+        self._row_versions: Dict[Hashable, int] = {}
+        self._deleted: Dict[Hashable, int] = {}
+        self.version = 0
+        # Последняя версия, подтвержденная браузером, и порядок строк в ней
+        self.acked = 0
+        self._acked_order: List[Hashable] = []
+        self._sent_orders: Dict[int, List[Hashable]] = {}
+        self.on('ack', self._handle_ack)
+        self.on('resync', self._handle_resync)
+        self.update_rows(list(rows))
+
+    @property
+    def rows(self) -> List[Dict[str, Any]]:
+        return self._live
+
+    @rows.setter
+    def rows(self, value: List[Dict[str, Any]]) -> None:
+        self.update_rows(value, clear_selection=False)
+
+    def update_rows(
+        self, rows: List[Dict[str, Any]], *, clear_selection: bool = True
+    ) -> None:
+        """
+        Функция заменяет строки таблицы и передает браузеру изменения
+        """
+        if clear_selection:
+            self.selected.clear()
+        rows = list(rows)
+        key = self.row_key
+        new = {row[key]: row for row in rows}
+        version = self.version + 1
+        changed = False
+        for row_key in list(self._current):
+            if row_key not in new:
+                del self._current[row_key]
+                del self._row_versions[row_key]
+                self._deleted[row_key] = version
+                changed = True
+        for row_key, row in new.items():
+            if self._current.get(row_key) != row:
+                self._current[row_key] = dict(row)
+                self._row_versions[row_key] = version
+                self._deleted.pop(row_key, None)
+                changed = True
+        order = list(new)
+        if order != self._order:
+            self._order = order
+            changed = True
+        self._live = rows
+        if changed:
+            self.version = version
+            self._sent_orders[version] = order
+            self._push()
+
+    def add_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self.update_rows(self._live + list(rows), clear_selection=False)
+
+    def remove_rows(self, rows: List[Dict[str, Any]]) -> None:
+        keys = {row[self.row_key] for row in rows}
+        self.selected[:] = [row for row in self.selected if row[self.row_key] not in keys]
+        self.update_rows(
+            [row for row in self._live if row[self.row_key] not in keys],
+            clear_selection=False
+        )
+
+    def _push(self) -> None:
+        base = self.acked
+        upserts = [
+            self._current[row_key] for row_key in self._order
+            if self._row_versions[row_key] > base
+        ]
+        deletes = [
+            row_key for row_key, version in self._deleted.items() if version > base
+        ]
+        order: Optional[List[Hashable]] = self._order
+        if self.version - 1 == base:
+            # Браузер находится в подтвержденной версии: порядок передается,
+            # только если он не получается сохранением оставшихся строк
+            # и добавлением новых в конец
+            kept = set(self._acked_order)
+            removed = set(deletes)
+            expected = [k for k in self._acked_order if k not in removed]
+            expected += [k for k in self._order if k not in kept]
+            if expected == self._order:
+                order = None
+        self.run_method('patch', base, self.version, upserts, deletes, order)
+
+    def _handle_ack(self, event: GenericEventArguments) -> None:
+        version = event.args
+        if not isinstance(version, int) or version <= self.acked:
+            return
+        if version > self.version:
+            return
+        self.acked = version
+        self._acked_order = self._sent_orders.get(version, self._order)
+        for sent in [v for v in self._sent_orders if v <= version]:
+            del self._sent_orders[sent]
+        # Отметки об удалении, подтвержденные браузером, больше не нужны
+        for row_key in [k for k, v in self._deleted.items() if v <= version]:
+            del self._deleted[row_key]
+
+    def _handle_resync(self, _: GenericEventArguments) -> None:
+        self.run_method(
+            'reset', self.version, [self._current[row_key] for row_key in self._order]
+        )
@@ -1,51 +1,72 @@
 import asyncio
 import telnetlib3
-from ndce.net import telnet_is_enabled
+from ndce.client import Client, DeviceUnreachable
+from ndce.expect import Expect, PromptTimeout
+from ndce import metrics
 import config
 
 
-class Telnet:
+class TelnetUnreachable(DeviceUnreachable):
+    """
+    Устройство не принимает соединение по telnet
+    """
+
+
+class Telnet(Client):
+    transport = 'telnet'
+
     def __init__(
         self,
         ip,
         username = config.USERNAME,
         password = config.PASSWORD,
-        commands = []
+        commands = [],
+        sysobjectid = None,
+        port = config.TELNET_PORT
     ):
-        self.ip = ip
-        self.username = username
-        self.password = password
-        self.commands = commands
+        super().__init__(ip, username, password, commands, sysobjectid, port)
+
+    async def open(self):
+        """
+        Функция устанавливает соединение с устройством.
+        Недоступность устройства сообщается исключением TelnetUnreachable.
+        """
+        try:
+            with metrics.measure('telnet_connect'):
+                return await asyncio.wait_for(
+                    telnetlib3.open_connection(host=self.ip, port=self.port),
+                    config.TELNET_CONNECT_TIMEOUT
+                )
+        except (OSError, asyncio.TimeoutError) as err:
+            raise TelnetUnreachable(
+                f'Устройство {self.ip} недоступно по telnet'
+            ) from err
 
-    async def shell(self, reader, writer):
+    async def login(self):
+        """
+        Функция устанавливает соединение, выполняет вход на устройство
+        и возвращает сессию
+        """
+        # Одно соединение без предварительной проверки порта:
+        # недоступность устройства определяется по таймауту соединения
+        reader, writer = await self.open()
+        session = Expect(reader, writer, self.profile, config.TELNET_COMMAND_TIMEOUT)
         try:
-            output = await reader.read(1024)
-            if output:
-                print(f'Соединение с {self.ip} установлено')
-                writer.write(self.username + '\n')
-                await asyncio.sleep(0.5)
-                writer.write(self.password + '\n')
-                await asyncio.sleep(0.5)
-                for command in self.commands:
-                    writer.write(command)
-                    await asyncio.sleep(0.5)
-                    print(await reader.read(1024))
-                await asyncio.sleep(0.5)
-                print(await reader.read(1024))
-        except Exception as err:
-            print(f'Ошибка соединения с {self.ip}')
-            print(err)
-    
-    async def cli_connect(self):
-        print(f'Соединение с {self.ip}')
-        if telnet_is_enabled(self.ip):
-            try:
-                reader, writer = await telnetlib3.open_connection(
-                    host=self.ip, shell=self.shell
+            with metrics.measure('telnet_login'):
+                await asyncio.wait_for(
+                    session.login(self.username, self.password),
+                    config.TELNET_LOGIN_TIMEOUT
                 )
-                await writer.protocol.waiter_closed
-            except Exception as err:
-                print(f'Ошибка соединения с {self.ip}')
-                print(err)
-        else:
-            print(f'Проверьте настройки telnet на {self.ip}')
\ No newline at end of file
+        except PromptTimeout:
+            # Приглашение не дождались раньше, чем истекло время входа
+            session.close()
+            raise
+        except asyncio.TimeoutError as err:
+            session.close()
+            raise asyncio.TimeoutError(
+                f'Превышено время входа {config.TELNET_LOGIN_TIMEOUT} с'
+            ) from err
+        except BaseException:
+            session.close()
+            raise
+        return session
@@ -0,0 +1,70 @@
+import asyncio
+from ndce.expect import Expect, get_profile
+
+
+class FakeReader:
+    """
+    Поток вывода устройства, отдающий заданные порции по одной
+    """
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    async def read(self, size):
+        if not self.chunks:
+            await asyncio.sleep(3600)
+        return self.chunks.pop(0)
+
+    def at_eof(self):
+        return False
+
+
+class FakeWriter:
+    def __init__(self):
+        self.sent = []
+
+    def write(self, data):
+        self.sent.append(data)
+
+    def is_closing(self):
+        return False
+
+    def close(self):
+        pass
+
+
+def run_commands(chunks, commands, profile=None):
+    async def main():
+        session = Expect(FakeReader(chunks), FakeWriter(), profile, timeout=1)
+        return [await session.command(command) for command in commands]
+    return asyncio.run(main())
+
+
+def test_output_line_ending_with_prompt_character():
+    outputs = run_commands(
+        [
+            'show proc cpu\r\nCPU utilization: 5%\r\n',
+            'Core 0: 3%\r\nswitch#',
+            'show clock\r\n12:00:00 UTC\r\nswitch#',
+        ],
+        ['show proc cpu', 'show clock'],
+    )
+    assert outputs == ['CPU utilization: 5%\nCore 0: 3%', '12:00:00 UTC']
+
+
+def test_prompt_split_between_chunks():
+    outputs = run_commands(
+        ['show ver\r\nVersion 1.0 #1\r\nsw', 'itch> '],
+        ['show ver'],
+    )
+    assert outputs == ['Version 1.0 #1']
+
+
+def test_mikrotik_prompt():
+    profile = get_profile('.1.3.6.1.4.1.14988.1')
+    assert profile['name'] == 'MikroTik'
+    outputs = run_commands(
+        ['/system identity print\r\n  name: [admin@core]>\r\n', '[admin@core] > '],
+        ['/system identity print'],
+        profile,
+    )
+    assert outputs == ['  name: [admin@core]>']
@@ -0,0 +1,36 @@
+import asyncio
+from ndce import push
+from ndce.push import PushResult, rollout_commands
+
+
+def test_rollout_ignores_unreachable_devices(monkeypatch):
+    devices = [{'host': f'10.0.0.{index}'} for index in range(1, 21)]
+    offline = {'10.0.0.1', '10.0.0.2'}
+    broken = {'10.0.0.3'}
+
+    async def push_device(device, *args):
+        host = device['host']
+        if host in offline:
+            return PushResult(host, reachable=False, error='Устройство недоступно')
+        return PushResult(host, success=host not in broken)
+
+    monkeypatch.setattr(push, 'push_device', push_device)
+
+    def run(devices):
+        progress = push.PushProgress(total=len(devices))
+        results = asyncio.run(rollout_commands(
+            devices, ['show version'], canary=5, max_failure_rate=0.4,
+            progress=progress
+        ))
+        return results, progress
+
+    # Недоступные устройства контрольной группы передачу не останавливают
+    results, progress = run(devices)
+    assert len(results) == len(devices)
+    assert not progress.stopped
+    assert progress.unreachable == 2
+    # Ошибки на доступных устройствах останавливают передачу
+    broken.update({'10.0.0.4', '10.0.0.5'})
+    results, progress = run(devices)
+    assert len(results) == 5
+    assert progress.stopped
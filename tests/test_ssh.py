@@ -0,0 +1,219 @@
+import asyncio
+import functools
+import asyncssh
+import pytest
+from ndce.push import TRANSPORTS, push_device
+from ndce.sessions import SessionPool
+from ndce.ssh import Ssh, SshUnreachable, get_ssh_connections
+import config
+
+
+USERNAME = 'admin'
+PASSWORD = 'secret'
+PROMPT = 'router#'
+
+
+class Device:
+    """
+    Устройство с ssh сервером в том же процессе: интерактивный канал
+    отвечает приглашением, команды exec выполняются с задержкой
+    """
+    def __init__(self, delay=0.0, prompt=PROMPT):
+        self.delay = delay
+        self.prompt = prompt
+        self.connections = 0
+        self.channels = 0
+        self.max_channels = 0
+
+    async def __aenter__(self):
+        device = self
+
+        class Server(asyncssh.SSHServer):
+            def connection_made(self, _):
+                device.connections += 1
+
+            def begin_auth(self, _):
+                return True
+
+            def password_auth_supported(self):
+                return True
+
+            def validate_password(self, username, password):
+                return username == USERNAME and password == PASSWORD
+
+        self.server = await asyncssh.listen(
+            '127.0.0.1', 0,
+            server_host_keys=[asyncssh.generate_private_key('ssh-ed25519')],
+            server_factory=Server,
+            process_factory=self.handle,
+            # Эхо команд выводит само устройство, как коммутатор
+            line_editor=False,
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *args):
+        get_ssh_connections().close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, process):
+        self.channels += 1
+        self.max_channels = max(self.max_channels, self.channels)
+        try:
+            if process.command:
+                await asyncio.sleep(self.delay)
+                process.stdout.write(f'output of {process.command}\n')
+                return
+            process.stdout.write(f'Welcome\r\n{self.prompt}')
+            while True:
+                line = await process.stdin.readline()
+                if not line:
+                    return
+                command = line.strip()
+                process.stdout.write(f'{command}\r\n')
+                if command:
+                    process.stdout.write(f'output of {command}\r\n')
+                process.stdout.write(self.prompt)
+        except (asyncssh.BreakReceived, asyncssh.TerminalSizeChanged):
+            pass
+        finally:
+            self.channels -= 1
+            process.exit(0)
+
+    def client(self, commands, password=PASSWORD):
+        return Ssh(
+            '127.0.0.1', USERNAME, password, commands, port=self.port
+        )
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 30))
+
+
+def test_cli_connect_runs_commands_in_interactive_channel():
+    async def main():
+        async with Device() as device:
+            outputs = await device.client(['show version', 'show clock']).cli_connect()
+            return outputs, device.connections
+    outputs, connections = run(main())
+    assert outputs == [
+        ('show version', 'output of show version'),
+        ('show clock', 'output of show clock'),
+    ]
+    assert connections == 1
+
+
+def test_exec_commands_share_one_connection():
+    async def main():
+        async with Device(delay=0.2) as device:
+            commands = [f'show {index}' for index in range(config.SSH_MAX_CHANNELS * 2)]
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            outputs = await device.client(commands).exec_commands()
+            elapsed = loop.time() - started
+            # Следующая передача тому же устройству использует то же соединение
+            await device.client(['show again']).exec_commands()
+            return commands, outputs, elapsed, device
+    commands, outputs, elapsed, device = run(main())
+    assert outputs == [(command, f'output of {command}\n') for command in commands]
+    assert device.connections == 1
+    assert device.max_channels == config.SSH_MAX_CHANNELS
+    # Команды выполнялись одновременно, по SSH_MAX_CHANNELS за раз
+    assert elapsed < 0.2 * len(commands) / 2
+
+
+def test_login_channel_counts_against_channel_limit():
+    async def main():
+        async with Device() as device:
+            client = device.client(['show version'])
+            _, channels = await client.open()
+            sessions = [await client.login() for _ in range(config.SSH_MAX_CHANNELS)]
+            assert channels.locked()
+            waiting = asyncio.ensure_future(client.login())
+            await asyncio.sleep(0.2)
+            assert not waiting.done()
+            sessions[0].close()
+            sessions[0] = await waiting
+            for session in sessions:
+                session.close()
+            return channels
+    channels = run(main())
+    assert not channels.locked()
+
+
+def test_idle_expiry_keeps_connections_with_open_channels(monkeypatch):
+    async def main():
+        async with Device() as device:
+            connections = get_ssh_connections()
+            monkeypatch.setattr(connections, 'idle_timeout', 0.2)
+            pool = SessionPool()
+            await device.client(['show a']).cli_connect(pool)
+            await asyncio.sleep(0.3)
+            # Сессия в пуле занимает канал, соединение не закрывается
+            kept = connections.expire()
+            outputs = await device.client(['show b']).cli_connect(pool)
+            pool.close()
+            await asyncio.sleep(0.3)
+            return kept, outputs, connections.expire(), device.connections
+    kept, outputs, expired, connections = run(main())
+    assert kept == 0
+    assert outputs == [('show b', 'output of show b')]
+    assert expired == 1
+    assert connections == 1
+
+
+def test_push_device_uses_channels_for_independent_commands(monkeypatch):
+    async def main():
+        async with Device(delay=0.1) as device:
+            monkeypatch.setitem(TRANSPORTS, 'ssh', functools.partial(
+                Ssh, username=USERNAME, password=PASSWORD, port=device.port
+            ))
+            result = await push_device(
+                {'host': '127.0.0.1', 'telnet': False, 'ssh': True},
+                ['show a', 'show b'],
+                parallel=True,
+            )
+            return result, device.max_channels
+    result, max_channels = run(main())
+    assert result.success, result.error
+    assert result.output == [
+        ('show a', 'output of show a\n'),
+        ('show b', 'output of show b\n'),
+    ]
+    assert max_channels == 2
+
+
+@pytest.mark.parametrize('login_timeout, command_timeout, message', [
+    (1, 0.2, 'Не дождались приглашения устройства за 0.2 с'),
+    (0.2, 1, 'Превышено время входа 0.2 с'),
+])
+def test_login_reports_the_timeout_that_fired(
+    monkeypatch, login_timeout, command_timeout, message
+):
+    monkeypatch.setattr(config, 'SSH_LOGIN_TIMEOUT', login_timeout)
+    monkeypatch.setattr(config, 'SSH_COMMAND_TIMEOUT', command_timeout)
+
+    async def main():
+        async with Device(prompt='') as device:
+            await device.client(['show version']).login()
+    with pytest.raises(asyncio.TimeoutError, match=message):
+        run(main())
+
+
+def test_wrong_password():
+    async def main():
+        async with Device() as device:
+            await device.client(['show version'], password='wrong').cli_connect()
+    with pytest.raises(PermissionError):
+        run(main())
+
+
+def test_unreachable_device():
+    async def main():
+        async with Device() as device:
+            port = device.port
+        client = Ssh('127.0.0.1', USERNAME, PASSWORD, ['show version'], port=port)
+        await client.cli_connect()
+    with pytest.raises(SshUnreachable):
+        run(main())